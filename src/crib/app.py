@@ -5,6 +5,7 @@ from crib import injection
 from crib.plugin_loader import ConfiguredPluginProvider, PluginsProvider, hook
 from crib.scraper import Scraper
 from crib.services.auth import AuthService
+from crib.services.pool import ProcessPool
 from crib.services.properties import PropertyService
 from crib.services.scrape import ScrapeService
 
@@ -14,6 +15,8 @@ class AppContainer(injection.Container):
     config_loaders = PluginsProvider(hook.crib_add_config_loaders)
     directions_service = ConfiguredPluginProvider(hook.crib_add_directions_services)
     directions_repository = ConfiguredPluginProvider(hook.crib_add_directions_repos)
+    route_cache = ConfiguredPluginProvider(hook.crib_add_route_caches)
+    process_pool = injection.SingletonProvider(ProcessPool)
     user_repository = ConfiguredPluginProvider(hook.crib_add_user_repos)
     property_service = injection.SingletonProvider(PropertyService)
     property_repository = ConfiguredPluginProvider(hook.crib_add_property_repos)
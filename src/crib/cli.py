@@ -94,6 +94,51 @@ def get_area(obj, max_duration, hullbuffer, alpha) -> None:
     )
 
 
+@main.command()
+@click.option("--min-duration", type=int, default=15 * 60, show_default=True)
+@click.option("--max-duration", type=int, default=60 * 60, show_default=True)
+@click.option("--step", type=click.IntRange(min=1), default=5 * 60, show_default=True)
+@click.option("--hullbuffer", type=float)
+@click.option("--alpha", type=int)
+@click.pass_obj
+def get_areas(obj, min_duration, max_duration, step, hullbuffer, alpha) -> None:
+    """Compute and store the areas for a range of durations."""
+    durations = range(min_duration, max_duration + 1, step)
+    areas = obj.directions_service.get_areas(
+        durations, hullbuffer=hullbuffer, alpha=alpha
+    )
+    for duration, area in areas.items():
+        click.echo(f"{duration}: {area.area if area else 0}")
+
+
+@main.command()
+@click.option("--max-price", type=int)
+@click.option("--favorite/--no-favorite", default=None)
+@click.option("--limit", type=int)
+@click.option("--max-duration", type=int)
+@click.option("--sort", type=click.Choice(["newest", "duration"]))
+@click.pass_obj
+def explain_find(obj, max_price, favorite, limit, max_duration, sort) -> None:
+    """Show how the database executes the property search."""
+    summary = obj.property_repository.explain(
+        max_price=max_price,
+        favorite=favorite,
+        limit=limit,
+        max_duration=max_duration,
+        sort=sort,
+    )
+    for key, value in summary.items():
+        click.echo(f"{key}: {value}")
+
+
+@main.command()
+@click.pass_obj
+def update_durations(obj) -> None:
+    """Estimate the duration to work of all properties again."""
+    count = obj.property_service.update_durations()
+    click.echo(f"Updated {count} properties")
+
+
 @main.command()
 @click.option("--banned", is_flag=True, help="Delete banned properties.")
 @click.option("--favorite", is_flag=True, help="Delete favorite properties.")
@@ -148,4 +193,13 @@ def add_user(obj, username: str, password: str) -> None:
 def fetch_to_work(obj, mode) -> None:
     app = obj.load_app()
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(app.directions_service.fetch_map_to_work(mode))
+    with click.progressbar(length=0, label="Fetching directions") as bar:
+
+        def progress(done, total):
+            bar.length = total
+            bar.update(1)
+
+        fetch = app.directions_service.fetch_map_to_work(mode, progress=progress)
+        loop.run_until_complete(fetch)
+    count = app.property_service.update_durations()
+    click.echo(f"Updated the duration to work of {count} properties")
@@ -1,5 +1,5 @@
 """Models for properties, directions, etc.
 """
 from .direction import Direction, Location  # noqa: F401
-from .property import Property  # noqa: F401
+from .property import Property, PropertySummary  # noqa: F401
 from .user import User  # noqa: F401
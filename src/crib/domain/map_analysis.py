@@ -1,31 +1,132 @@
-import math
-
 import numpy as np  # type: ignore
-from scipy.spatial import Delaunay  # type: ignore
+from scipy.interpolate import (  # type: ignore
+    LinearNDInterpolator,
+    NearestNDInterpolator,
+    griddata,
+)
+from scipy.spatial import Delaunay, QhullError  # type: ignore
 from shapely import geometry  # type: ignore
 from shapely.ops import polygonize, unary_union  # type: ignore
 
+DEFAULT_ALPHA = 450
+DEFAULT_HULLBUFFER = 0.0014
+
 
 def get_area(directions, alpha=None, hullbuffer=None):
     if not directions:
         return None
 
-    alpha = alpha or 450
+    alpha = alpha or DEFAULT_ALPHA
 
     if hullbuffer is None:
-        hullbuffer = 0.0014
+        hullbuffer = DEFAULT_HULLBUFFER
 
     directions = np.array(directions)
 
     polys = alpha_shape(directions, alpha)
-    if polys.geom_type == "Polygon":
-        polys = polys.buffer(hullbuffer)
-    else:
-        polys = unary_union([p.buffer(hullbuffer) for p in polys])
-    return polys
+    return _buffer(polys, hullbuffer)
+
+
+def get_areas(directions, durations, max_durations, alpha=None, hullbuffer=None):
+    """Compute nested areas for several maximum durations at once.
+
+    All areas share one triangulation of the directions within the largest
+    maximum duration. An area only contains triangles whose corners are all
+    within its maximum duration.
 
+    Args:
+        directions: Coordinate pairs of the directions.
+        durations: The duration of each direction.
+        max_durations: The maximum durations of the areas.
+
+    Returns:
+        A list with the area for each maximum duration, None if it contains
+        no directions.
+    """
+    alpha = alpha or DEFAULT_ALPHA
+
+    if hullbuffer is None:
+        hullbuffer = DEFAULT_HULLBUFFER
 
-def alpha_shape(points, alpha):
+    points = np.asarray(directions, dtype=float).reshape(-1, 2)
+    values = np.asarray(durations, dtype=float)
+    within = values <= max(max_durations, default=0)
+    points = points[within]
+    values = values[within]
+
+    if len(points) < 4:
+        return [
+            get_area(points[values <= max_duration].tolist(), alpha, hullbuffer)
+            for max_duration in max_durations
+        ]
+
+    tri, circum_r = _triangulate(points)
+    small = circum_r < 1.0 / alpha
+    slowest = values[tri.simplices].max(axis=1)
+    areas = []
+    for max_duration in max_durations:
+        if not (values <= max_duration).any():
+            areas.append(None)
+            continue
+        polys = _shape_from_triangles(points, tri, small & (slowest <= max_duration))
+        areas.append(_buffer(polys, hullbuffer))
+    return areas
+
+
+def _buffer(polys, hullbuffer):
+    # Less than three points or collinear points give a Point or LineString
+    if not hasattr(polys, "geoms"):
+        return polys.buffer(hullbuffer)
+    return unary_union([p.buffer(hullbuffer) for p in polys.geoms])
+
+
+def interpolate_grid(points, values, lats, lngs):
+    """Linearly interpolate scattered values onto a regular grid.
+
+    Args:
+        points: Coordinate pairs (latitude, longitude) of the values.
+        values: The values at the points.
+        lats: Latitudes of the grid.
+        lngs: Longitudes of the grid.
+
+    Returns:
+        Coordinate pairs (latitude, longitude) of the grid points inside the
+        convex hull of the points and the values at these grid points.
+    """
+    grid_lat, grid_lng = np.meshgrid(lats, lngs, indexing="ij")
+    grid = griddata(np.array(points), np.array(values), (grid_lat, grid_lng))
+    inside = ~np.isnan(grid)
+    locations = np.column_stack([grid_lat[inside], grid_lng[inside]])
+    return locations, grid[inside]
+
+
+def duration_estimator(points, values):
+    """Build a function which interpolates durations at arbitrary locations.
+
+    The triangulation is computed once, so evaluating the function for a batch
+    of locations is cheap. Locations outside of the convex hull of the points
+    are estimated as NaN. If the points cannot be triangulated, the value of
+    the nearest point is used instead.
+
+    Args:
+        points: Coordinate pairs (latitude, longitude) of the values.
+        values: The values at the points.
+
+    Returns:
+        A function which maps an array of coordinate pairs (latitude,
+        longitude) to an array of estimated values.
+    """
+    points = np.array(points, dtype=float)
+    values = np.array(values, dtype=float)
+    if len(points) >= 3:
+        try:
+            return LinearNDInterpolator(points, values)
+        except QhullError:
+            pass
+    return NearestNDInterpolator(points, values)
+
+
+def alpha_shape(points, alpha, method="boundary"):
     """Compute the alpha shape (concave hull) of a set of points.
 
     Credits: http://blog.thehumangeo.com/2014/05/12/drawing-boundaries-in-python/
@@ -34,48 +135,70 @@ def alpha_shape(points, alpha):
         points: Iterable container of coordinate pairs.
         alpha: The higher the value, the less big areas between points are
         allowed.
+        method: "boundary" builds the polygons from the edges which belong to
+        exactly one kept triangle. "polygonize" unions all kept triangles,
+        which is a lot slower for dense points.
     """
+    if method not in ("boundary", "polygonize"):
+        raise ValueError(f"Invalid alpha shape method {method}")
     if len(points) < 4:
         # When you have a triangle, there is no sense
         # in computing an alpha shape.
         return geometry.MultiPoint(list(points)).convex_hull
 
-    def add_edge(edges, edge_points, coords, i, j):
-        """
-        Add a line between the i-th and j-th points,
-        if not in the list already
-        """
-        if (i, j) in edges or (j, i) in edges:
-            # already added
-            return
-        edges.add((i, j))
-        edge_points.append(coords[[i, j]])
-
-    coords = points
+    coords = np.asarray(points, dtype=float)
+    tri, circum_r = _triangulate(coords)
+    # Here's the radius filter. Degenerate triangles have an infinite radius.
+    is_kept = circum_r < 1.0 / alpha
+    return _shape_from_triangles(coords, tri, is_kept, method)
+
+
+def _triangulate(coords):
+    """Delaunay triangulation and the circumradius of every triangle."""
     tri = Delaunay(coords)
-    edges = set()
-    edge_points = []
-    # loop over triangles:
-    # ia, ib, ic = indices of corner points of the
-    # triangle
-    for ia, ib, ic in tri.vertices:
-        pa = coords[ia]
-        pb = coords[ib]
-        pc = coords[ic]
-        # Lengths of sides of triangle
-        a = math.sqrt((pa[0] - pb[0]) ** 2 + (pa[1] - pb[1]) ** 2)
-        b = math.sqrt((pb[0] - pc[0]) ** 2 + (pb[1] - pc[1]) ** 2)
-        c = math.sqrt((pc[0] - pa[0]) ** 2 + (pc[1] - pa[1]) ** 2)
-        # Semiperimeter of triangle
-        s = (a + b + c) / 2.0
-        # Area of triangle by Heron's formula
-        area = math.sqrt(s * (s - a) * (s - b) * (s - c))
+    simplices = tri.simplices
+    pa = coords[simplices[:, 0]]
+    pb = coords[simplices[:, 1]]
+    pc = coords[simplices[:, 2]]
+    # Lengths of sides of the triangles
+    a = np.hypot(*(pa - pb).T)
+    b = np.hypot(*(pb - pc).T)
+    c = np.hypot(*(pc - pa).T)
+    # Areas of the triangles from the cross product, which unlike Heron's
+    # formula doesn't turn negative for degenerate triangles.
+    ab = pb - pa
+    ac = pc - pa
+    area = np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) / 2.0
+    with np.errstate(divide="ignore", invalid="ignore"):
         circum_r = a * b * c / (4.0 * area)
-        # Here's the radius filter.
-        if circum_r < 1.0 / alpha:
-            add_edge(edges, edge_points, coords, ia, ib)
-            add_edge(edges, edge_points, coords, ib, ic)
-            add_edge(edges, edge_points, coords, ic, ia)
-    m = geometry.MultiLineString(edge_points)
-    triangles = list(polygonize(m))
-    return unary_union(triangles)
+    return tri, circum_r
+
+
+def _shape_from_triangles(coords, tri, is_kept, method="boundary"):
+    """Union of the triangles of the triangulation selected by is_kept."""
+    kept = tri.simplices[is_kept]
+
+    # edges of the kept triangles and how many kept triangles share them
+    edges = np.concatenate([kept[:, [0, 1]], kept[:, [1, 2]], kept[:, [2, 0]]])
+    edges, counts = np.unique(np.sort(edges, axis=1), axis=0, return_counts=True)
+
+    if method == "polygonize":
+        m = geometry.MultiLineString(list(coords[edges]))
+        triangles = list(polygonize(m))
+        return unary_union(triangles)
+
+    # Edges shared by two kept triangles are inside the shape
+    boundary = geometry.MultiLineString(list(coords[edges[counts == 1]]))
+    faces = list(polygonize(boundary))
+    if not faces:
+        return geometry.GeometryCollection()
+    # The boundary also encloses holes. A face is part of the shape if it is
+    # covered by kept triangles.
+    inside = np.array([f.representative_point().coords[0] for f in faces])
+    simplex = tri.find_simplex(inside)
+    # find_simplex returns -1 outside of the triangulation
+    is_kept = np.append(is_kept, False)
+    polys = [f for f, k in zip(faces, is_kept[simplex]) if k]
+    if len(polys) == 1:
+        return polys[0]
+    return geometry.MultiPolygon(polys)
@@ -9,7 +9,9 @@ import cattr  # type: ignore
 
 from crib.exceptions import InvalidData
 
-converter = cattr.Converter()
+# The GenConverter generates and caches a specialized function per attrs
+# class on first use instead of inspecting the attributes on every call.
+converter = cattr.GenConverter(unstruct_collection_overrides={tuple: tuple})
 converter.register_unstructure_hook(datetime, lambda dt: dt)
 converter.register_structure_hook(datetime, lambda ts, _: ts)
 
@@ -22,7 +24,7 @@ class Model:
     def fromdict(cls: Type[T], data: Dict) -> T:
         try:
             return converter.structure(data, cls)
-        except (ValueError, TypeError) as err:
+        except (KeyError, ValueError, TypeError) as err:
             raise InvalidData("Invalid data", {"unknown": str(err)})
 
     def asdict(self) -> Dict:
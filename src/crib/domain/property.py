@@ -2,12 +2,17 @@
 Property model
 """
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import attr
+from cattr.gen import (  # type: ignore
+    make_dict_structure_fn,
+    make_dict_unstructure_fn,
+    override,
+)
 
 from . import Direction, Location
-from .model import Model
+from .model import Model, converter
 
 
 @attr.s(frozen=True)
@@ -17,6 +22,10 @@ class Price:
     frequency: str = attr.ib()
 
 
+def _as_direction(value):
+    return Direction.fromdict(value) if isinstance(value, dict) else value
+
+
 @attr.s(frozen=True)
 class Property(Model):
     bedrooms: int = attr.ib()
@@ -38,6 +47,54 @@ class Property(Model):
     lettingInformation: Dict = attr.ib()
     feesApplyText: str = attr.ib(default="")
     featuredProperty: bool = attr.ib(default=False)
-    toWork: Optional[Direction] = attr.ib(default=None)
+    # Direction or its raw data until toWork is first accessed
+    _toWork: Any = attr.ib(default=None, eq=_as_direction, repr=False)
     favorite: bool = attr.ib(default=False)
     banned: bool = attr.ib(default=False)
+    # Seconds to work estimated from the directions raster
+    toWorkDuration: Optional[int] = attr.ib(default=None)
+
+    @property
+    def toWork(self) -> Optional[Direction]:
+        if isinstance(self._toWork, dict):
+            object.__setattr__(self, "_toWork", Direction.fromdict(self._toWork))
+        return self._toWork
+
+
+_rename_to_work = {"_toWork": override(rename="toWork")}
+converter.register_structure_hook(
+    Property, make_dict_structure_fn(Property, converter, **_rename_to_work)
+)
+converter.register_unstructure_hook(
+    Property, make_dict_unstructure_fn(Property, converter, **_rename_to_work)
+)
+
+
+@attr.s(frozen=True)
+class PropertySummary(Model):
+    """The fields of a property needed to show it on a map.
+
+    Only the first image of the property is kept.
+    """
+
+    id: str = attr.ib()
+    firstVisibleDate: datetime = attr.ib()
+    location: Location = attr.ib()
+    price: Price = attr.ib()
+    bedrooms: int = attr.ib()
+    propertyImages: Tuple[str, ...] = attr.ib()
+    favorite: bool = attr.ib(default=False)
+    toWorkDuration: Optional[int] = attr.ib(default=None)
+
+    @classmethod
+    def from_property(cls, prop: Property) -> "PropertySummary":
+        return cls(
+            id=prop.id,
+            firstVisibleDate=prop.firstVisibleDate,
+            location=prop.location,
+            price=prop.price,
+            bedrooms=prop.bedrooms,
+            propertyImages=prop.propertyImages[:1],
+            favorite=prop.favorite,
+            toWorkDuration=prop.toWorkDuration,
+        )
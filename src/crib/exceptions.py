@@ -50,6 +50,10 @@ class DirectionsError(Exception):
     pass
 
 
+class TransientDirectionsError(DirectionsError):
+    pass
+
+
 class InvalidCredentials(Exception):
     pass
 
@@ -6,7 +6,7 @@ import pluggy  # type: ignore
 from crib import config, exceptions, plugins
 from crib.injection import AbstractProvider, Container
 from crib.repositories import directions as dirrepo
-from crib.repositories import properties, user
+from crib.repositories import properties, routes, user
 from crib.services import directions
 
 hookspec = pluggy.HookspecMarker("crib")
@@ -20,6 +20,8 @@ DR = TypeVar("DR", bound=dirrepo.DirectionsRepo)
 TDR = Type[DR]
 DS = TypeVar("DS", bound=directions.DirectionsService)
 TDS = Type[DS]
+RC = TypeVar("RC", bound=routes.RouteCache)
+TRC = Type[RC]
 
 
 class CribSpec:
@@ -66,6 +68,14 @@ class CribSpec:
         """
         return []
 
+    @hookspec
+    def crib_add_route_caches(self) -> List[TRC]:  # pragma: no cover
+        """Add route caches for directions services
+
+        :return: a list of RouteCaches
+        """
+        return []
+
 
 def _init_plugin_manager() -> pluggy.PluginManager:
     pm = pluggy.PluginManager("crib")
@@ -76,6 +86,7 @@ def _init_plugin_manager() -> pluggy.PluginManager:
     pm.register(user)
     pm.register(directions)
     pm.register(dirrepo)
+    pm.register(routes)
     return pm
 
 
@@ -0,0 +1,46 @@
+"""
+Base classes for repositories
+"""
+import asyncio
+import concurrent.futures
+import functools
+from typing import Any, Callable, Dict, TypeVar
+
+from crib import plugins
+
+T = TypeVar("T")
+
+
+class Repo(plugins.Plugin):
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Call a function which uses the repository from a coroutine.
+
+        The call blocks the event loop, which is fine for repositories that
+        do no I/O.
+        """
+        return func(*args, **kwargs)
+
+
+class ThreadedRepo(Repo):
+    """Repository which runs calls from coroutines in a thread pool.
+
+    The event loop keeps serving other requests while the database is queried.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.config["max-workers"],
+            thread_name_prefix=type(self).__name__,
+        )
+
+    @classmethod
+    def config_schema(cls) -> Dict[str, Any]:
+        schema = super(ThreadedRepo, cls).config_schema()
+        schema.update({"max-workers": {"type": "integer", "min": 1, "default": 8}})
+        return schema
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_event_loop()
+        call = functools.partial(func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
@@ -2,23 +2,62 @@
 Repository for route data
 """
 import abc
-from typing import Dict, Iterable, List, Type, TypeVar
+import datetime
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
 
 import geopandas
 from shapely.geometry import shape
 
 import crib
-from crib import plugins
-from crib.domain.direction import Direction
+from crib.domain.direction import Direction, Location
 
-from . import mongo
+from . import base, mongo
 
 
-class DirectionsRepo(plugins.Plugin):
+class DirectionsRepo(base.Repo):
     @abc.abstractmethod
     def insert(self, direction: Direction) -> None:
         pass
 
+    @abc.abstractmethod
+    def insert_cell(
+        self, origin: Location, mode: str, direction: Optional[Direction]
+    ) -> None:
+        """Store the direction fetched for a raster cell.
+
+        Replaces a previously stored direction for the same cell and mode.
+        ``None`` marks a cell which was fetched but has no route.
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_fetched_cells(self, mode: str) -> Dict[Location, datetime.datetime]:
+        """Return the stored raster cells of the mode and when they were fetched."""
+        pass
+
+    @abc.abstractmethod
+    def get_cell_durations(self, mode: str) -> Dict[Location, Optional[int]]:
+        """Return the durations of the stored raster cells of the mode.
+
+        Cells without a route have a duration of ``None``.
+        """
+        pass
+
+    @abc.abstractmethod
+    def insert_property_route(
+        self, prop_id: str, mode: str, direction: Direction
+    ) -> None:
+        """Store the route from a property to work for the travel mode.
+
+        Replaces a previously stored route of the property and mode.
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_property_route(self, prop_id: str, mode: str) -> Optional[Direction]:
+        pass
+
     @abc.abstractmethod
     def get_all(self) -> Iterable[Direction]:
         pass
@@ -27,10 +66,26 @@ class DirectionsRepo(plugins.Plugin):
     def get_to_work_durations(self) -> Iterable[Dict]:
         pass
 
-    def insert_to_work_area(self, max_duration: int, area):
+    def directions_version(self) -> int:
+        """Version of the stored directions, which changes on every insert."""
+        return 0
+
+    def insert_to_work_area(
+        self,
+        max_duration: int,
+        area,
+        alpha: int,
+        hullbuffer: float,
+        version: Optional[int] = None,
+    ):
+        """Store an area computed from the given version of the directions.
+
+        Areas of outdated versions are not stored.
+        """
         pass
 
-    def get_to_work_area(self, max_duration: int):
+    def get_to_work_area(self, max_duration: int, alpha: int, hullbuffer: float):
+        """Return the area computed from the current directions, if stored."""
         pass
 
 
@@ -38,33 +93,87 @@ class MemoryDirectionsRepo(DirectionsRepo):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self._storage: List[Direction] = []
-        self._work_areas: Dict[int, any] = {}
+        self._cells: Dict[
+            Tuple[str, Location], Tuple[datetime.datetime, Optional[Direction]]
+        ] = {}
+        self._work_areas: Dict[Tuple[int, int, float], Any] = {}
+        self._version = 0
+        self._property_routes: Dict[Tuple[str, str], Direction] = {}
+
+    def _changed(self) -> None:
+        self._version += 1
+        self._work_areas.clear()
 
     def insert(self, direction: Direction) -> None:
         self._storage.append(direction)
+        self._changed()
+
+    def insert_cell(
+        self, origin: Location, mode: str, direction: Optional[Direction]
+    ) -> None:
+        self._cells[(mode, origin)] = (datetime.datetime.utcnow(), direction)
+        self._changed()
+
+    def get_fetched_cells(self, mode: str) -> Dict[Location, datetime.datetime]:
+        return {
+            origin: fetched
+            for (m, origin), (fetched, _) in self._cells.items()
+            if m == mode
+        }
+
+    def get_cell_durations(self, mode: str) -> Dict[Location, Optional[int]]:
+        return {
+            origin: d.duration.value if d else None
+            for (m, origin), (_, d) in self._cells.items()
+            if m == mode
+        }
+
+    def insert_property_route(
+        self, prop_id: str, mode: str, direction: Direction
+    ) -> None:
+        self._property_routes[(prop_id, mode)] = direction
+
+    def get_property_route(self, prop_id: str, mode: str) -> Optional[Direction]:
+        return self._property_routes.get((prop_id, mode))
 
     def get_all(self) -> Iterable[Direction]:
-        for d in self._storage:
-            yield d
+        yield from self._storage
+        for _, d in self._cells.values():
+            if d is not None:
+                yield d
 
     def get_to_work_durations(self) -> Iterable[Dict]:
-        for d in self._storage:
+        for d in self.get_all():
             yield {
-                "location": {
-                    "latitude": d.start_location.lat,
-                    "longitude": d.start_location.lng,
-                },
-                "duration": d.duration.value,
+                "location": [d.start_location.lat, d.start_location.lng],
+                "durationValue": d.duration.value,
+                "duration": d.duration.text,
             }
 
-    def insert_to_work_area(self, max_duration: int, area):
-        self._work_areas[max_duration] = area
+    def directions_version(self) -> int:
+        return self._version
+
+    def insert_to_work_area(
+        self,
+        max_duration: int,
+        area,
+        alpha: int,
+        hullbuffer: float,
+        version: Optional[int] = None,
+    ):
+        if version is not None and version != self._version:
+            return
+        self._work_areas[(max_duration, alpha, hullbuffer)] = area
 
-    def get_to_work_area(self, max_duration: int):
-        return self._work_areas.get(max_duration)
+    def get_to_work_area(self, max_duration: int, alpha: int, hullbuffer: float):
+        return self._work_areas.get((max_duration, alpha, hullbuffer))
 
 
 class MongoDirectionsRepo(DirectionsRepo, mongo.MongoRepo):
+    _CELL_KEYS = ("_id", "mode", "origin", "fetched")
+    # Cells without a route only store the cell keys
+    _WITH_ROUTE = {"duration": {"$exists": True}}
+
     @property
     def _directions(self):
         return self.db.directions
@@ -73,32 +182,127 @@ class MongoDirectionsRepo(DirectionsRepo, mongo.MongoRepo):
     def _work_areas(self):
         return self.db.work_areas
 
+    @property
+    def _meta(self):
+        return self.db.directions_meta
+
+    @property
+    def _property_routes(self):
+        return self.db.property_routes
+
+    def _changed(self) -> None:
+        self._meta.update_one({"_id": "version"}, {"$inc": {"value": 1}}, upsert=True)
+
     def insert(self, direction: Direction) -> None:
         d = direction.asdict()
         self._directions.insert_one(d)
+        self._changed()
+
+    def insert_cell(
+        self, origin: Location, mode: str, direction: Optional[Direction]
+    ) -> None:
+        d = direction.asdict() if direction else {}
+        key = f"{mode}:{origin.latitude},{origin.longitude}"
+        d.update(
+            {
+                "_id": key,
+                "mode": mode,
+                "origin": {"lat": origin.latitude, "lng": origin.longitude},
+                "fetched": datetime.datetime.utcnow(),
+            }
+        )
+        self._directions.replace_one({"_id": key}, d, upsert=True)
+        self._changed()
+
+    def get_fetched_cells(self, mode: str) -> Dict[Location, datetime.datetime]:
+        cells = {}
+        for c in self._find_cells(mode, {"origin": 1, "fetched": 1}):
+            cells[self._cell_origin(c)] = c["fetched"]
+        return cells
+
+    def get_cell_durations(self, mode: str) -> Dict[Location, Optional[int]]:
+        cells = {}
+        for c in self._find_cells(mode, {"origin": 1, "duration.value": 1}):
+            duration = c.get("duration")
+            cells[self._cell_origin(c)] = duration["value"] if duration else None
+        return cells
+
+    def _find_cells(self, mode: str, projection: Dict):
+        # anchored prefix match on _id is served by the _id index
+        query = {"_id": {"$regex": f"^{re.escape(mode)}:"}}
+        return self._directions.find(query, projection)
+
+    @staticmethod
+    def _cell_origin(cell: Dict) -> Location:
+        return Location(latitude=cell["origin"]["lat"], longitude=cell["origin"]["lng"])
+
+    def insert_property_route(
+        self, prop_id: str, mode: str, direction: Direction
+    ) -> None:
+        key = f"{prop_id}:{mode}"
+        d = dict(direction.asdict(), _id=key, property=prop_id, mode=mode)
+        self._property_routes.replace_one({"_id": key}, d, upsert=True)
+
+    def get_property_route(self, prop_id: str, mode: str) -> Optional[Direction]:
+        d = self._property_routes.find_one({"_id": f"{prop_id}:{mode}"})
+        if not d:
+            return None
+        for key in ("_id", "property", "mode"):
+            del d[key]
+        return Direction.fromdict(d)
 
     def get_all(self) -> Iterable[Direction]:
-        for d in self._directions.find():
-            d.pop("_id")
+        for d in self._directions.find(self._WITH_ROUTE):
+            for key in self._CELL_KEYS:
+                d.pop(key, None)
             yield Direction.fromdict(d)
 
     def get_to_work_durations(self) -> Iterable[Dict]:
-        for d in self._directions.find():
+        for d in self._directions.find(self._WITH_ROUTE):
             yield {
                 "location": [d["start_location"]["lat"], d["start_location"]["lng"]],
                 "durationValue": d["duration"]["value"],
                 "duration": d["duration"]["text"],
             }
 
-    def insert_to_work_area(self, max_duration: int, area):
+    def directions_version(self) -> int:
+        meta = self._meta.find_one({"_id": "version"})
+        return meta["value"] if meta else 0
+
+    def insert_to_work_area(
+        self,
+        max_duration: int,
+        area,
+        alpha: int,
+        hullbuffer: float,
+        version: Optional[int] = None,
+    ):
+        current = self.directions_version()
+        if version is not None and version != current:
+            return
+        # drop areas of outdated directions
+        self._work_areas.delete_many({"version": {"$ne": current}})
+
         areajson = geopandas.GeoSeries(area).__geo_interface__
         if not areajson["features"]:
             return
         areadata = areajson["features"][0]["geometry"]
-        self._work_areas.insert_one({"max_duration": max_duration, "area": areadata})
+        key = {
+            "max_duration": max_duration,
+            "alpha": alpha,
+            "hullbuffer": hullbuffer,
+            "version": current,
+        }
+        self._work_areas.replace_one(key, dict(key, area=areadata), upsert=True)
 
-    def get_to_work_area(self, max_duration: int):
-        result = next(self._work_areas.find({"max_duration": max_duration}), None)
+    def get_to_work_area(self, max_duration: int, alpha: int, hullbuffer: float):
+        query = {
+            "max_duration": max_duration,
+            "alpha": alpha,
+            "hullbuffer": hullbuffer,
+            "version": self.directions_version(),
+        }
+        result = self._work_areas.find_one(query)
         if not result:
             return None
         data = result["area"]
@@ -108,10 +312,14 @@ class MongoDirectionsRepo(DirectionsRepo, mongo.MongoRepo):
         return area
 
 
+class ThreadedMongoDirectionsRepo(base.ThreadedRepo, MongoDirectionsRepo):
+    """MongoDirectionsRepo which does not block the event loop of the server."""
+
+
 DR = TypeVar("DR", bound=DirectionsRepo)
 TDR = Type[DR]
 
 
 @crib.hookimpl
 def crib_add_directions_repos() -> Iterable[TDR]:
-    return [MemoryDirectionsRepo, MongoDirectionsRepo]
+    return [MemoryDirectionsRepo, MongoDirectionsRepo, ThreadedMongoDirectionsRepo]
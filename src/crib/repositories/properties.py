@@ -2,21 +2,38 @@
 Simple crud repository base class
 """
 import abc
+import bisect
+import collections
+import datetime
+import heapq
 import itertools
-from typing import Any, Dict, Iterable, Type, TypeVar
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type, TypeVar
 
+import attr
 import geopandas
 import pymongo  # type: ignore
 from shapely import geometry
+from shapely.prepared import prep
 
 import crib
-from crib import exceptions, plugins
-from crib.domain import Property
+from crib import exceptions
+from crib.domain import Location, Property, PropertySummary
+from crib.domain.model import converter
 
-from . import mongo
+from . import base, mongo
 
+# Sort value (firstVisibleDate or toWorkDuration) and id of the last property
+# of a page
+Cursor = Tuple[Any, str]
 
-class PropertyRepo(plugins.Plugin):
+SORTS = ("newest", "duration")
+# Fields changed by the user, which storing scraped properties keeps
+USER_FIELDS = ("favorite", "banned")
+
+
+class PropertyRepo(base.Repo):
     @abc.abstractmethod
     def insert(self, prop: Property) -> None:
         pass
@@ -25,16 +42,54 @@ class PropertyRepo(plugins.Plugin):
     def update(self, prop: Property) -> None:
         pass
 
+    @abc.abstractmethod
+    def bulk_upsert(self, props: Iterable[Property]) -> None:
+        """Insert new properties and update existing ones.
+
+        The USER_FIELDS of existing properties are kept, so they may be
+        changed while scraped properties wait to be stored.
+        """
+        pass
+
+    @abc.abstractmethod
+    def set_fields(self, identity: str, **fields) -> None:
+        """Change some fields of a stored property without replacing it."""
+        pass
+
+    @abc.abstractmethod
+    def set_durations(self, durations: Dict[str, Optional[int]]) -> None:
+        """Store the estimated durations to work of properties by id.
+
+        Unknown ids are ignored.
+        """
+        pass
+
     @abc.abstractmethod
     def get(self, identity: str) -> Property:
         pass
 
+    @abc.abstractmethod
+    def get_many(
+        self, identities: Iterable[str], fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """Return the stored properties of the ids by id.
+
+        With ``fields`` only these fields are read and returned as dictionary
+        of unstructured values instead of a :class:`Property`.
+        """
+        pass
+
     @abc.abstractmethod
     def exists(self, identity: str) -> bool:
         pass
 
     @abc.abstractmethod
-    def get_all(self) -> Iterable[Property]:
+    def get_all(self, unestimated: bool = False) -> Iterable[Property]:
+        """Return all properties.
+
+        With ``unestimated`` only properties whose duration to work was never
+        estimated are returned.
+        """
         pass
 
     @abc.abstractmethod
@@ -51,25 +106,170 @@ class PropertyRepo(plugins.Plugin):
 
     @abc.abstractmethod
     def find(
-        self, max_price=None, favorite=None, area=None, limit=None
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        after: Optional[Cursor] = None,
+        max_duration=None,
+        sort=None,
     ) -> Iterable[Property]:
+        """Find properties, newest first.
+
+        Properties with the same firstVisibleDate are ordered by descending id.
+        With the "duration" sort, properties are ordered by ascending
+        toWorkDuration and id instead and properties without a duration are
+        left out, like they are with ``max_duration``.
+
+        Pass the sort value and id of the last property of a page as ``after``
+        to get the next page.
+
+        With the "summary" projection only a :class:`PropertySummary` of
+        each property is returned.
+        """
+        pass
+
+    @abc.abstractmethod
+    def explain(
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        after: Optional[Cursor] = None,
+        max_duration=None,
+        sort=None,
+    ) -> Dict[str, Any]:
+        """Summarize how the database executes :meth:`find`.
+
+        The summary names the used indexes, whether the properties are sorted
+        in memory and how many properties are returned in how many
+        milliseconds. Counts the repository does not track are None.
+        """
         pass
 
 
 class MemoryPropertyRepo(PropertyRepo):
+    # Size of the cells of the spatial index in degrees (~1km)
+    _GRID_SIZE = 0.01
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self._storage: Dict[str, Property] = {}
+        self._grid: Dict[Tuple[int, int], Set[str]] = collections.defaultdict(set)
+        # sorted (price, id), (firstVisibleDate, id) and (toWorkDuration, id)
+        self._by_price: List[Tuple[int, str]] = []
+        self._by_date: List[Cursor] = []
+        self._by_duration: List[Tuple[int, str]] = []
+
+    def _cell(self, location: Location) -> Tuple[int, int]:
+        return (
+            math.floor(location.longitude / self._GRID_SIZE),
+            math.floor(location.latitude / self._GRID_SIZE),
+        )
+
+    def _index(self, prop: Property) -> None:
+        self._grid[self._cell(prop.location)].add(prop.id)
+        bisect.insort(self._by_price, (prop.price.amount, prop.id))
+        bisect.insort(self._by_date, _sort_key(prop))
+        if prop.toWorkDuration is not None:
+            bisect.insort(self._by_duration, _duration_key(prop))
+
+    def _unindex(self, prop: Property) -> None:
+        cell = self._cell(prop.location)
+        self._grid[cell].discard(prop.id)
+        if not self._grid[cell]:
+            del self._grid[cell]
+        _remove_sorted(self._by_price, (prop.price.amount, prop.id))
+        _remove_sorted(self._by_date, _sort_key(prop))
+        if prop.toWorkDuration is not None:
+            _remove_sorted(self._by_duration, _duration_key(prop))
+
+    def _reindex(self) -> None:
+        self._grid.clear()
+        for prop in self._storage.values():
+            self._grid[self._cell(prop.location)].add(prop.id)
+        props = self._storage.values()
+        self._by_price = sorted((p.price.amount, p.id) for p in props)
+        self._by_date = sorted(map(_sort_key, props))
+        self._by_duration = sorted(
+            _duration_key(p) for p in props if p.toWorkDuration is not None
+        )
+
+    def _in_area(self, area) -> Iterable[str]:
+        """Return the ids of the properties within the area."""
+        prepared = prep(area)
+        size = self._GRID_SIZE
+        minx, miny, maxx, maxy = area.bounds
+        imin, imax = math.floor(minx / size), math.floor(maxx / size)
+        jmin, jmax = math.floor(miny / size), math.floor(maxy / size)
+        # Visit the occupied cells or the cells of the bounds, whichever are
+        # fewer, so large areas don't walk millions of empty cells.
+        if (imax - imin + 1) * (jmax - jmin + 1) > len(self._grid):
+            cells = [
+                (i, j) for i, j in self._grid if imin <= i <= imax and jmin <= j <= jmax
+            ]
+        else:
+            cells = [
+                (i, j) for i in range(imin, imax + 1) for j in range(jmin, jmax + 1)
+            ]
+        for i, j in cells:
+            ids = self._grid.get((i, j))
+            if not ids:
+                continue
+            box = geometry.box(i * size, j * size, (i + 1) * size, (j + 1) * size)
+            if prepared.contains(box):
+                yield from ids
+            elif prepared.intersects(box):
+                for identity in ids:
+                    loc = self._storage[identity].location
+                    point = geometry.Point(loc.longitude, loc.latitude)
+                    if prepared.contains(point):
+                        yield identity
 
     def insert(self, prop: Property) -> None:
         if prop.id in self._storage:
             raise exceptions.DuplicateProperty(prop)
         self._storage[prop.id] = prop
+        self._index(prop)
 
     def update(self, prop: Property) -> None:
         if prop.id not in self._storage:
             raise exceptions.EntityNotFound(prop.id)
+        self._unindex(self._storage[prop.id])
         self._storage[prop.id] = prop
+        self._index(prop)
+
+    def bulk_upsert(self, props: Iterable[Property]) -> None:
+        for prop in props:
+            stored = self._storage.get(prop.id)
+            if stored is not None:
+                self._unindex(stored)
+                prop = prop.replace(**{f: getattr(stored, f) for f in USER_FIELDS})
+            self._storage[prop.id] = prop
+            self._index(prop)
+
+    def set_fields(self, identity: str, **fields) -> None:
+        _check_fields(fields, settable=True)
+        try:
+            prop = self._storage[identity]
+        except KeyError:
+            raise exceptions.EntityNotFound(identity)
+        self._unindex(prop)
+        self._storage[identity] = prop = prop.replace(**fields)
+        self._index(prop)
+
+    def set_durations(self, durations: Dict[str, Optional[int]]) -> None:
+        for identity, duration in durations.items():
+            prop = self._storage.get(identity)
+            if prop is None or prop.toWorkDuration == duration:
+                continue
+            self._unindex(prop)
+            self._storage[identity] = prop = prop.replace(toWorkDuration=duration)
+            self._index(prop)
 
     def exists(self, identity: str) -> bool:
         return identity in self._storage
@@ -77,15 +277,30 @@ class MemoryPropertyRepo(PropertyRepo):
     def get(self, identity: str) -> Property:
         return self._storage.get(identity)
 
-    def get_all(self) -> Iterable[Property]:
+    def get_many(
+        self, identities: Iterable[str], fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        props = {i: self._storage[i] for i in identities if i in self._storage}
+        if fields is None:
+            return props
+        fields = list(fields)
+        _check_fields(fields)
+        return {
+            i: {f: converter.unstructure(getattr(p, f)) for f in fields}
+            for i, p in props.items()
+        }
+
+    def get_all(self, unestimated: bool = False) -> Iterable[Property]:
         for p in self._storage.values():
-            yield p
+            if not unestimated or p.toWorkDuration is None:
+                yield p
 
     def delete(self, identity: str) -> None:
         try:
-            del self._storage[identity]
+            prop = self._storage.pop(identity)
         except KeyError:
             raise exceptions.EntityNotFound(identity)
+        self._unindex(prop)
 
     def clear(self, banned=False, favorites=False) -> None:
         if banned and favorites:
@@ -96,31 +311,268 @@ class MemoryPropertyRepo(PropertyRepo):
             for k, v in self._storage.items()
             if not ((banned and v.banned) or (favorites and v.favorite))
         }
+        self._reindex()
 
     def count(self) -> int:
         return len(self._storage)
 
     def find(
-        self, max_price=None, favorite=None, area=None, limit=None
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        after: Optional[Cursor] = None,
+        max_duration=None,
+        sort=None,
+    ) -> Iterable[Property]:
+        _check_projection(projection)
+        _check_sort(sort)
+        if sort == "duration":
+            props = self._find_by_duration(
+                max_price, favorite, area, limit, after, max_duration
+            )
+        else:
+            if after is not None:
+                after = (_naive_utc(after[0]), after[1])
+            props = self._find(max_price, favorite, area, limit, after, max_duration)
+        if projection == "summary":
+            return map(PropertySummary.from_property, props)
+        return props
+
+    def _find(
+        self, max_price, favorite, area, limit, after, max_duration=None
     ) -> Iterable[Property]:
         limit = limit or 1000
         max_price = max_price or 1450
-        predicate = (
-            lambda p: p.price.amount <= max_price
-            and (favorite is None or p.favorite == favorite)
-            and (
-                area is None
-                or area.contains(
-                    geometry.Point(p.location.longitude, p.location.latitude)
-                )
+
+        def predicate(p):
+            return (
+                p.price.amount <= max_price
+                and (favorite is None or p.favorite == favorite)
+                and (after is None or _sort_key(p) < after)
+                and _within_duration(p, max_duration)
+            )
+
+        index = self._choose_index(max_price, area, max_duration)
+        if index == "newest":
+            # Most properties match, stream them newest first.
+            start = len(self._by_date)
+            if after is not None:
+                start = bisect.bisect_left(self._by_date, after)
+            newest = (
+                self._storage[self._by_date[i][1]] for i in range(start - 1, -1, -1)
             )
+            return itertools.islice(filter(predicate, newest), limit)
+        if index == "location":
+            candidates = (self._storage[i] for i in self._in_area(area))
+        elif index == "duration":
+            reachable = self._duration_within(max_duration)
+            candidates = (self._storage[i] for _, i in self._by_duration[:reachable])
+        else:
+            within = self._price_within(max_price)
+            candidates = (self._storage[i] for _, i in self._by_price[:within])
+
+        props = filter(predicate, candidates)
+        return iter(heapq.nlargest(limit, props, key=_sort_key))
+
+    def explain(
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        after: Optional[Cursor] = None,
+        max_duration=None,
+        sort=None,
+    ) -> Dict[str, Any]:
+        start = time.perf_counter()
+        props = self.find(
+            max_price, favorite, area, limit, projection, after, max_duration, sort
         )
+        returned = sum(1 for _ in props)
+        millis = round((time.perf_counter() - start) * 1000)
+
+        if sort == "duration":
+            indexes = ["duration"] + (["location"] if area is not None else [])
+            in_memory_sort = False
+        else:
+            index = self._choose_index(max_price or 1450, area, max_duration)
+            indexes = [index]
+            in_memory_sort = index != "newest"
+        return {
+            "stages": ["FILTER", "SORT"] if in_memory_sort else ["FILTER"],
+            "indexes": indexes,
+            "inMemorySort": in_memory_sort,
+            "returned": returned,
+            "keysExamined": None,
+            "docsExamined": None,
+            "millis": millis,
+        }
 
-        props = (p for p in self._storage.values() if predicate(p))
-        return itertools.islice(props, limit)
+    def _choose_index(self, max_price, area, max_duration) -> str:
+        """Choose the index which _find reads the candidates from.
+
+        Returns "location", "newest", "duration" or "price".
+        """
+        if area is not None:
+            return "location"
+        # number of properties within the price and the duration
+        within = self._price_within(max_price)
+        reachable = len(self._by_price)
+        if max_duration is not None:
+            reachable = self._duration_within(max_duration)
+        if min(within, reachable) > len(self._by_price) / 2:
+            return "newest"
+        return "duration" if reachable < within else "price"
+
+    def _price_within(self, max_price) -> int:
+        """Number of properties with a price up to max_price."""
+        return bisect.bisect_left(self._by_price, (math.floor(max_price) + 1,))
+
+    def _duration_within(self, max_duration) -> int:
+        """Number of properties with a duration up to max_duration."""
+        return bisect.bisect_left(self._by_duration, (math.floor(max_duration) + 1,))
+
+    def _find_by_duration(
+        self, max_price, favorite, area, limit, after, max_duration
+    ) -> Iterable[Property]:
+        limit = limit or 1000
+        max_price = max_price or 1450
+        start = 0 if after is None else bisect.bisect_right(self._by_duration, after)
+        stop = len(self._by_duration)
+        if max_duration is not None:
+            stop = self._duration_within(max_duration)
+        ids = set(self._in_area(area)) if area is not None else None
+
+        def predicate(p):
+            return (
+                p.price.amount <= max_price
+                and (favorite is None or p.favorite == favorite)
+                and (ids is None or p.id in ids)
+            )
+
+        shortest = (self._storage[i] for _, i in self._by_duration[start:stop])
+        return itertools.islice(filter(predicate, shortest), limit)
+
+
+def _check_fields(fields: Iterable[str], settable: bool = False) -> None:
+    # init names of the attributes, without the underscore of private ones
+    known = {a.name.lstrip("_") for a in attr.fields(Property)}
+    if settable:
+        known.discard("id")
+    invalid = sorted(set(fields) - known)
+    if invalid:
+        raise exceptions.InvalidQuery(f"Invalid fields {', '.join(invalid)}")
+
+
+def _check_projection(projection) -> None:
+    if projection not in (None, "full", "summary"):
+        raise exceptions.InvalidQuery(f"Unknown projection {projection!r}")
+
+
+def _check_sort(sort) -> None:
+    if sort not in (None,) + SORTS:
+        raise exceptions.InvalidQuery(f"Unknown sort {sort!r}")
+
+
+def _sort_key(prop: Property) -> Cursor:
+    return _naive_utc(prop.firstVisibleDate), prop.id
+
+
+def _duration_key(prop: Property) -> Tuple[int, str]:
+    return prop.toWorkDuration, prop.id
+
+
+def _within_duration(prop: Property, max_duration) -> bool:
+    if max_duration is None:
+        return True
+    return prop.toWorkDuration is not None and prop.toWorkDuration <= max_duration
+
+
+def _naive_utc(date: datetime.datetime) -> datetime.datetime:
+    """The date as naive UTC, like it is stored in MongoDB."""
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def _remove_sorted(values: List, value) -> None:
+    i = bisect.bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        del values[i]
 
 
 class MongoPropertyRepo(PropertyRepo, mongo.MongoRepo):
+    # Indexes for the queries of find. The compound indexes follow the
+    # equality, sort, range order of the filter and sort by firstVisibleDate or
+    # toWorkDuration.
+    _INDEXES = [
+        pymongo.IndexModel([("location", pymongo.GEOSPHERE)], name="location"),
+        pymongo.IndexModel(
+            [
+                ("firstVisibleDate", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+                ("price.amount", pymongo.ASCENDING),
+            ],
+            name="newest",
+        ),
+        pymongo.IndexModel(
+            [
+                ("favorite", pymongo.ASCENDING),
+                ("firstVisibleDate", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+                ("price.amount", pymongo.ASCENDING),
+            ],
+            name="favorite_newest",
+        ),
+        pymongo.IndexModel(
+            [
+                ("toWorkDuration", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+                ("price.amount", pymongo.ASCENDING),
+            ],
+            name="duration",
+        ),
+        pymongo.IndexModel(
+            [
+                ("favorite", pymongo.ASCENDING),
+                ("toWorkDuration", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+                ("price.amount", pymongo.ASCENDING),
+            ],
+            name="favorite_duration",
+        ),
+    ]
+
+    _SUMMARY_FIELDS = {
+        "id": True,
+        "firstVisibleDate": True,
+        "location": True,
+        "price": True,
+        "bedrooms": True,
+        "propertyImages": {"$slice": 1},
+        "favorite": True,
+        "toWorkDuration": True,
+    }
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        if self.config["ensure-indexes"]:
+            self.ensure_indexes()
+
+    @classmethod
+    def config_schema(cls) -> Dict[str, Any]:
+        schema = super(MongoPropertyRepo, cls).config_schema()
+        schema.update({"ensure-indexes": {"type": "boolean", "default": True}})
+        return schema
+
+    def ensure_indexes(self) -> None:
+        """Create the indexes for find. Existing indexes are kept."""
+        self._props.create_indexes(self._INDEXES)
+
     @property
     def _props(self):
         return self.db.properties
@@ -135,6 +587,12 @@ class MongoPropertyRepo(PropertyRepo, mongo.MongoRepo):
         data["location"] = {"longitude": coords[0], "latitude": coords[1]}
         return Property.fromdict(data)
 
+    def _to_summary(self, data: Dict[str, Any]) -> PropertySummary:
+        data.pop("_id")
+        coords = data["location"]["coordinates"]
+        data["location"] = {"longitude": coords[0], "latitude": coords[1]}
+        return PropertySummary.fromdict(data)
+
     def _to_storage(self, prop: Property) -> Dict[str, Any]:
         p = prop.asdict()
         p["_id"] = prop.id
@@ -144,6 +602,12 @@ class MongoPropertyRepo(PropertyRepo, mongo.MongoRepo):
         }
         return p
 
+    def _to_upsert(self, prop: Property) -> Dict[str, Any]:
+        p = self._to_storage(prop)
+        del p["_id"]
+        user = {f: p.pop(f) for f in USER_FIELDS}
+        return {"$set": p, "$setOnInsert": user}
+
     def exists(self, identity: str) -> bool:
         return bool(self._props.find_one({"_id": identity}))
 
@@ -161,17 +625,107 @@ class MongoPropertyRepo(PropertyRepo, mongo.MongoRepo):
             raise exceptions.EntityNotFound(prop.id)
         assert result.matched_count == 1, "Duplicate IDs"
 
+    def bulk_upsert(self, props: Iterable[Property]) -> None:
+        # The unordered writes may be applied in any order, so only the last
+        # version of each property is written.
+        latest = {prop.id: prop for prop in props}
+        requests = [
+            pymongo.UpdateOne({"_id": prop.id}, self._to_upsert(prop), upsert=True)
+            for prop in latest.values()
+        ]
+        if not requests:
+            return
+        try:
+            self._props.bulk_write(requests, ordered=False)
+        except pymongo.errors.BulkWriteError as err:
+            # Concurrent upserts of a new property insert it only once, the
+            # others fail with a duplicate key and update it when retried.
+            failed = err.details["writeErrors"]
+            if any(e["code"] != 11000 for e in failed):
+                raise
+            retries = [requests[e["index"]] for e in failed]
+            self._props.bulk_write(retries, ordered=False)
+
+    def set_fields(self, identity: str, **fields) -> None:
+        _check_fields(fields, settable=True)
+        values = {name: converter.unstructure(v) for name, v in fields.items()}
+        if "location" in values:
+            loc = values["location"]
+            values["location"] = {
+                "type": "Point",
+                "coordinates": [loc["longitude"], loc["latitude"]],
+            }
+        result = self._props.update_one({"_id": identity}, {"$set": values})
+        if result.matched_count == 0:
+            raise exceptions.EntityNotFound(identity)
+
+    def set_durations(self, durations: Dict[str, Optional[int]]) -> None:
+        requests = [
+            pymongo.UpdateOne({"_id": i}, {"$set": {"toWorkDuration": d}})
+            for i, d in durations.items()
+        ]
+        if requests:
+            self._props.bulk_write(requests, ordered=False)
+
     def get(self, identity: str) -> Property:
         data = self._props.find_one({"_id": identity})
         return self._to_prop(data) if data else None
 
-    def get_all(self):
-        for data in self._props.find():
+    def get_many(
+        self, identities: Iterable[str], fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        query = {"_id": {"$in": list(identities)}}
+        if fields is None:
+            props = (self._to_prop(d) for d in self._props.find(query))
+            return {p.id: p for p in props}
+
+        fields = list(fields)
+        _check_fields(fields)
+        result = {}
+        for data in self._props.find(query, {f: True for f in fields}):
+            if "location" in data:
+                coords = data["location"]["coordinates"]
+                data["location"] = {"longitude": coords[0], "latitude": coords[1]}
+            result[data["_id"]] = {f: data.get(f) for f in fields}
+        return result
+
+    def get_all(self, unestimated: bool = False) -> Iterable[Property]:
+        # properties outside of the directions raster store a null duration
+        query = {"toWorkDuration": {"$exists": False}} if unestimated else {}
+        for data in self._props.find(query):
             yield self._to_prop(data)
 
     def find(
-        self, max_price=None, favorite=None, area=None, limit=None
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        after: Optional[Cursor] = None,
+        max_duration=None,
+        sort=None,
     ) -> Iterable[Property]:
+        _check_projection(projection)
+        _check_sort(sort)
+        queried_props = self._find(
+            max_price, favorite, area, limit, projection, after, max_duration, sort
+        )
+        if projection == "summary":
+            return map(self._to_summary, queried_props)
+        return map(self._to_prop, queried_props)
+
+    def _find(
+        self,
+        max_price,
+        favorite,
+        area,
+        limit,
+        projection=None,
+        after=None,
+        max_duration=None,
+        sort=None,
+    ):
         max_price = max_price or 1450
         limit = limit or 5000
         params = {
@@ -189,13 +743,45 @@ class MongoPropertyRepo(PropertyRepo, mongo.MongoRepo):
             ]
             params["location"] = {"$geoWithin": {"$geometry": geoarea}}
 
-        queried_props = self._props.find(params)
-        order_by = [("firstVisibleDate", pymongo.DESCENDING)]
-        queried_props = queried_props.sort(order_by)
-        queried_props = queried_props.limit(limit)
+        if max_duration is not None:
+            params["toWorkDuration"] = {"$lte": max_duration}
+        elif sort == "duration":
+            params["toWorkDuration"] = {"$ne": None}
+
+        if sort == "duration":
+            field, order, compare = "toWorkDuration", pymongo.ASCENDING, "$gt"
+        else:
+            field, order, compare = "firstVisibleDate", pymongo.DESCENDING, "$lt"
+
+        if after is not None:
+            value, identity = after
+            params["$or"] = [
+                {field: {compare: value}},
+                {field: value, "_id": {compare: identity}},
+            ]
 
-        for data in queried_props:
-            yield self._to_prop(data)
+        fields = self._SUMMARY_FIELDS if projection == "summary" else None
+        queried_props = self._props.find(params, fields)
+        queried_props = queried_props.sort([(field, order), ("_id", order)])
+        return queried_props.limit(limit)
+
+    def explain(
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        after: Optional[Cursor] = None,
+        max_duration=None,
+        sort=None,
+    ) -> Dict[str, Any]:
+        _check_projection(projection)
+        _check_sort(sort)
+        queried_props = self._find(
+            max_price, favorite, area, limit, projection, after, max_duration, sort
+        )
+        return _plan_summary(queried_props.explain())
 
     def delete(self, identity: str) -> None:
         result = self._props.delete_one({"_id": identity})
@@ -225,10 +811,42 @@ class MongoPropertyRepo(PropertyRepo, mongo.MongoRepo):
         ]
 
 
+def _plan_summary(explained: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce the output of explain to the used indexes and the work done."""
+    stages = []
+    indexes = []
+    plan = explained["queryPlanner"]["winningPlan"]
+    plan = plan.get("queryPlan", plan)  # slot based execution engine
+    pending = [plan]
+    while pending:
+        stage = pending.pop()
+        stages.append(stage["stage"])
+        if "indexName" in stage:
+            indexes.append(stage["indexName"])
+        pending.extend(stage.get("inputStages", []))
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+
+    stats = explained.get("executionStats", {})
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "inMemorySort": "SORT" in stages,
+        "returned": stats.get("nReturned"),
+        "keysExamined": stats.get("totalKeysExamined"),
+        "docsExamined": stats.get("totalDocsExamined"),
+        "millis": stats.get("executionTimeMillis"),
+    }
+
+
+class ThreadedMongoPropertyRepo(base.ThreadedRepo, MongoPropertyRepo):
+    """MongoPropertyRepo which does not block the event loop of the server."""
+
+
 PR = TypeVar("PR", bound=PropertyRepo)
 TPR = Type[PR]
 
 
 @crib.hookimpl
 def crib_add_property_repos() -> Iterable[TPR]:
-    return [MemoryPropertyRepo, MongoPropertyRepo]
+    return [MemoryPropertyRepo, MongoPropertyRepo, ThreadedMongoPropertyRepo]
@@ -0,0 +1,174 @@
+"""
+Cache for routes fetched from a directions service
+"""
+import abc
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple, Type, TypeVar
+
+import crib
+
+from . import base
+
+
+class RouteCache(base.Repo):
+    """Cache for raw routes of a directions service.
+
+    Entries expire after ``ttl`` days and the least recently used entries are
+    evicted once more than ``max-entries`` are stored.
+    """
+
+    @classmethod
+    def config_schema(cls) -> Dict[str, Any]:
+        return {
+            "ttl": {"type": "float", "min": 0, "default": 30.0},
+            "max-entries": {"type": "integer", "min": 1, "default": 100000},
+        }
+
+    @property
+    def _ttl_seconds(self) -> float:
+        return self.config["ttl"] * 24 * 60 * 60
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached route or None if it is missing or expired."""
+        pass
+
+    @abc.abstractmethod
+    def put(self, key: str, route: Dict) -> None:
+        pass
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class NoRouteCache(RouteCache):
+    """Disables caching."""
+
+    def get(self, key: str) -> Optional[Dict]:
+        return None
+
+    def put(self, key: str, route: Dict) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class MemoryRouteCache(RouteCache):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._storage: Dict[str, Tuple[float, Dict]] = collections.OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            created, route = self._storage[key]
+        except KeyError:
+            return None
+        if created < time.time() - self._ttl_seconds:
+            del self._storage[key]
+            return None
+        self._storage.move_to_end(key)
+        return route
+
+    def put(self, key: str, route: Dict) -> None:
+        self._storage[key] = (time.time(), route)
+        self._storage.move_to_end(key)
+        while len(self._storage) > self.config["max-entries"]:
+            self._storage.popitem(last=False)
+
+    def clear(self) -> None:
+        self._storage.clear()
+
+
+class SqliteRouteCache(base.ThreadedRepo, RouteCache):
+    """Route cache persisted in a SQLite database.
+
+    Coroutines access the database in a thread pool.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        path = os.path.expanduser(self.config["path"])
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                "key TEXT PRIMARY KEY, route TEXT, created REAL, accessed REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS routes_accessed ON routes (accessed)"
+            )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+
+    @classmethod
+    def config_schema(cls) -> Dict[str, Any]:
+        schema = super(SqliteRouteCache, cls).config_schema()
+        schema.update({"path": {"type": "string", "required": True}})
+        return schema
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT route, created FROM routes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            route, created = row
+            if created < now - self._ttl_seconds:
+                self._conn.execute("DELETE FROM routes WHERE key = ?", (key,))
+                self._count -= 1
+                return None
+            self._conn.execute(
+                "UPDATE routes SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(route)
+
+    def put(self, key: str, route: Dict) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            exists = self._conn.execute(
+                "SELECT 1 FROM routes WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?)",
+                (key, json.dumps(route), now, now),
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self.config["max-entries"]:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._conn.execute(
+            "DELETE FROM routes WHERE created < ?", (time.time() - self._ttl_seconds,)
+        )
+        self._conn.execute(
+            "DELETE FROM routes WHERE key IN "
+            "(SELECT key FROM routes ORDER BY accessed LIMIT "
+            "max(0, (SELECT COUNT(*) FROM routes) - ?))",
+            (self.config["max-entries"],),
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM routes")
+            self._count = 0
+
+
+RC = TypeVar("RC", bound=RouteCache)
+TRC = Type[RC]
+
+
+@crib.hookimpl
+def crib_add_route_caches() -> Iterable[TRC]:
+    return [NoRouteCache, MemoryRouteCache, SqliteRouteCache]
@@ -5,6 +5,9 @@ from functools import partial
 
 from crib import injection
 
+# Fields of already stored properties, which the spiders keep
+EXISTING_FIELDS = ("banned", "favorite", "toWork")
+
 
 class WithInjection(injection.Component):
     @classmethod
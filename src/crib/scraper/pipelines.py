@@ -5,15 +5,77 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://doc.scrapy.org/en/latest/topics/item-pipeline.html
 
+import logging
+from typing import Dict
+
+from twisted.internet import task  # type: ignore
+
 from crib import injection
+from crib.domain import Property
 from crib.scraper import base
 
+log = logging.getLogger(__name__)
+
 
 class CribPipeline(base.WithInjection):
+    """Store scraped properties in batches.
+
+    Properties are upserted in bulk once ``CRIB_BATCH_SIZE`` are buffered,
+    every ``CRIB_BATCH_INTERVAL`` seconds and when the spider closes. Their
+    duration to work is estimated before they are stored.
+
+    A batch holds the last scraped version of each property. It is kept until
+    it is stored, so a failed write is retried with the next flush. Favorites
+    and bans changed in the meantime are not overwritten.
+    """
+
     property_repository = injection.Dependency()
+    property_service = injection.Dependency()
+
+    def __init__(self, *args, batch_size: int = 100, interval: float = 5.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self.interval = interval
+        self._batch: Dict[str, Property] = {}
+        self._timer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return super(CribPipeline, cls).from_crawler(
+            crawler,
+            batch_size=settings.getint("CRIB_BATCH_SIZE", 100),
+            interval=settings.getfloat("CRIB_BATCH_INTERVAL", 5.0),
+        )
+
+    def open_spider(self, spider):
+        if self.interval > 0:
+            self._timer = task.LoopingCall(self._flush_periodically)
+            self._timer.start(self.interval, now=False)
+
+    def close_spider(self, spider):
+        if self._timer and self._timer.running:
+            self._timer.stop()
+        self.flush()
 
     def process_item(self, item, spider):
-        if item["existing"]:
-            self.property_repository.update(item["prop"])
-        else:
-            self.property_repository.insert(item["prop"])
+        prop = item["prop"]
+        self._batch[prop.id] = prop
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush(self):
+        if not self._batch:
+            return
+        props = self.property_service.estimate_durations(self._batch.values())
+        self.property_repository.bulk_upsert(props)
+        log.debug("Stored %s properties", len(self._batch))
+        self._batch = {}
+
+    def _flush_periodically(self):
+        # An error would stop the timer
+        try:
+            self.flush()
+        except Exception:
+            log.exception("Storing %s properties failed", len(self._batch))
@@ -40,8 +40,12 @@ class RightmoveSpider(base.WithInjection, scrapy.Spider):
         properties = model["properties"]
         for data in properties:
             _make_id(data)
-            existing = self.property_repository.get(data["id"])
-            if existing and existing.banned:
+        stored = self.property_repository.get_many(
+            [data["id"] for data in properties], fields=base.EXISTING_FIELDS
+        )
+        for data in properties:
+            existing = stored.get(data["id"])
+            if existing and existing["banned"]:
                 continue
             callback = functools.partial(self.parse_property, data, existing)
             yield response.follow(data["propertyUrl"], callback=callback)
@@ -139,9 +143,8 @@ def to_prop(data, existing=None):
 
     d = {k: conversions.get(k, identity)(data[k]) for k in keys}
     if existing:
-        d["favorite"] = existing.favorite
-        if existing.toWork:
-            d["toWork"] = existing.toWork.asdict()
+        d["favorite"] = existing["favorite"]
+        d["toWork"] = existing["toWork"]
 
     return Property.fromdict(d)
 
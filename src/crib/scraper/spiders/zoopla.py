@@ -39,8 +39,12 @@ class ZooplaSpider(base.WithInjection, scrapy.Spider):
         properties = model["listing"]
         for data in properties:
             _make_id(data)
-            existing = self.property_repository.get(data["id"])
-            if existing and existing.banned:
+        stored = self.property_repository.get_many(
+            [data["id"] for data in properties], fields=base.EXISTING_FIELDS
+        )
+        for data in properties:
+            existing = stored.get(data["id"])
+            if existing and existing["banned"]:
                 continue
             callback = functools.partial(self.parse_property, data, existing)
             yield response.follow(data["details_url"], callback=callback)
@@ -74,10 +78,8 @@ class ZooplaSpider(base.WithInjection, scrapy.Spider):
                 "Furnishing": data["furnished_state"],
             },
             "feesApplyText": data.get("letting_fees", ""),
-            "favorite": existing.favorite if existing else False,
-            "toWork": existing.toWork.asdict()
-            if existing and existing.toWork
-            else None,
+            "favorite": existing["favorite"] if existing else False,
+            "toWork": existing["toWork"] if existing else None,
         }
         prop = Property.fromdict(propd)
         yield PropertyItem({"prop": prop, "existing": existing})
@@ -1,6 +1,7 @@
 """
 Server for crib.
 """
+import logging
 import os
 
 import quart.flask_patch  # noqa: F401
@@ -11,6 +12,8 @@ from crib import injection
 
 from . import auth, directions, properties, scrape
 
+log = logging.getLogger(__name__)
+
 
 class Flask(injection.Component, Quart):
     _crib_config = injection.Infrastructure("config")
@@ -51,4 +54,14 @@ def create_app(container):
     app.register_blueprint(scrape.bp)
     auth.init_app(app)
 
+    @app.before_serving
+    async def estimate_durations():
+        # properties stored before their durations were estimated
+        service = app.property_service
+        count = await service.property_repository.run(
+            service.update_durations, unestimated=True
+        )
+        if count:
+            log.info("Estimated the duration to work of %s properties", count)
+
     return app
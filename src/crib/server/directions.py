@@ -7,6 +7,8 @@ import geopandas  # type: ignore
 from flask_jwt_extended import jwt_required  # type: ignore
 from quart import Blueprint, current_app, jsonify, request  # type: ignore
 
+from .streaming import stream_json
+
 bp = Blueprint("directions", __name__, url_prefix="/directions")
 log = logging.getLogger(__name__)
 
@@ -30,13 +32,15 @@ async def colormaps():
 async def to_work_durations():
     maxDuration = request.args.get("maxDuration", 3000, int)
     colormap = request.args.get("colormap", "thermal_r")
+    service = current_app.directions_service
+    run = service.directions_repository.run
     try:
-        durations = current_app.directions_service.to_work_durations(
-            colormap=colormap, maxDuration=maxDuration
+        durations = await run(
+            service.to_work_durations, colormap=colormap, maxDuration=maxDuration
         )
-        return jsonify(durations)
     except ValueError as err:
         return jsonify({"msg": str(err)}), 400
+    return stream_json(durations, run=run)
 
 
 @bp.route("/get_area", methods=["GET"], endpoint="get_area")
@@ -52,7 +56,32 @@ async def get_area():
     except (TypeError, ValueError):
         return jsonify({"msg": "Invalid parameter"}), 400
 
-    area = current_app.directions_service.get_area(
+    service = current_app.directions_service
+    area = await service.get_area_async(
         max_duration=maxDuration, alpha=alpha, hullbuffer=hullbuffer
     )
     return geopandas.GeoSeries(area).to_json()
+
+
+@bp.route("/get_areas", methods=["GET"], endpoint="get_areas")
+@jwt_required()
+async def get_areas():
+    args = request.args
+    try:
+        minDuration = int(args.get("minDuration", 15 * 60))
+        maxDuration = int(args.get("maxDuration", 60 * 60))
+        step = int(args.get("step", 5 * 60))
+        alpha = args.get("alpha", None)
+        alpha = alpha and int(alpha)
+        hullbuffer = args.get("hullbuffer", None)
+        hullbuffer = hullbuffer and float(hullbuffer)
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Invalid parameter"}), 400
+
+    if step <= 0 or (maxDuration - minDuration) // step > 100:
+        return jsonify({"msg": "Invalid step"}), 400
+
+    durations = list(range(minDuration, maxDuration + 1, step))
+    service = current_app.directions_service
+    areas = await service.get_areas_async(durations, alpha=alpha, hullbuffer=hullbuffer)
+    return geopandas.GeoSeries([areas[d] for d in durations], index=durations).to_json()
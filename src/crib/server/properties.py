@@ -8,6 +8,8 @@ from shapely.ops import unary_union
 
 from crib import exceptions
 
+from .streaming import stream_json
+
 bp = Blueprint("properties", __name__, url_prefix="/properties")
 
 
@@ -19,25 +21,50 @@ async def find():
     max_price = json.get("max_price")
     favorite = json.get("favorite")
     max_duration = json.get("max_duration")
-
-    area = current_app.directions_service.get_area(max_duration)
-    userarea = _geo_json_to_shape(json.get("area"))
-    if area:
-        if userarea:
-            area = area.intersection(userarea)
-    else:
-        area = userarea
+    projection = json.get("projection")
+    sort = json.get("sort")
+
+    # a union of a few drawn polygons, cheap enough for the event loop
+    area = _geo_json_to_shape(json.get("area"))
+
+    service = current_app.property_service
+    run = current_app.property_repository.run
+    if "cursor" in json:
+        try:
+            props, cursor = await service.find_page(
+                max_price=max_price,
+                favorite=favorite,
+                area=area,
+                limit=limit,
+                projection=projection,
+                cursor=json["cursor"],
+                max_duration=max_duration,
+                sort=sort,
+            )
+        except ValueError as err:
+            return jsonify({"msg": str(err)}), 400
+        props = await run(list, _serialized(service, props))
+        return jsonify({"properties": props, "cursor": cursor})
 
     try:
-        props = [
-            p.asdict()
-            for p in current_app.property_service.find(
-                max_price=max_price, favorite=favorite, area=area, limit=limit
-            )
-        ]
+        props = service.iter_find(
+            max_price=max_price,
+            favorite=favorite,
+            area=area,
+            limit=limit,
+            projection=projection,
+            max_duration=max_duration,
+            sort=sort,
+        )
     except ValueError as err:
         return jsonify({"msg": str(err)}), 400
-    return jsonify(props)
+    return stream_json(_serialized(service, props), run=run)
+
+
+def _serialized(service, props):
+    """Serialize the properties, estimating missing durations to work."""
+    for prop in service.complete_durations(props):
+        yield prop.asdict()
 
 
 @bp.route("/to_work", methods=["GET"], endpoint="to_work")
@@ -58,8 +85,13 @@ async def to_work():
         )
     except exceptions.EntityNotFound as err:
         return jsonify({"msg": str(err)}), 400
+    except exceptions.InvalidData as err:
+        # the directions service returned a route crib can't read
+        return jsonify({"msg": str(err)}), 502
 
-    return jsonify(route)
+    if route is None:
+        return jsonify({"msg": f"No {mode} route to work found"}), 404
+    return jsonify(route.asdict())
 
 
 @bp.route("/favorite", methods=["PUT"], endpoint="favorite")
@@ -74,7 +106,7 @@ async def favorite():
         return jsonify({"msg": "favorite is missing"}), 400
 
     try:
-        current_app.property_service.favorite(prop_id, favorite)
+        await current_app.property_service.favorite(prop_id, favorite)
     except exceptions.EntityNotFound as err:
         return jsonify({"msg": str(err)}), 400
 
@@ -93,7 +125,7 @@ async def ban():
         return jsonify({"msg": "banned is missing"}), 400
 
     try:
-        current_app.property_service.ban(prop_id, banned)
+        await current_app.property_service.ban(prop_id, banned)
     except exceptions.EntityNotFound as err:
         return jsonify({"msg": str(err)}), 400
 
@@ -116,7 +148,8 @@ async def save_search_area():
     if geojson is None:
         return jsonify({"msg": "geojson is missing"}), 400
 
-    current_app.property_service.save_search_area(name, geojson)
+    service = current_app.property_service
+    await service.property_repository.run(service.save_search_area, name, geojson)
 
     return jsonify({"msg": "success"}), 200
 
@@ -124,6 +157,7 @@ async def save_search_area():
 @bp.route("/get_search_areas", methods=["GET"], endpoint="get_search_areas")
 @jwt_required()
 async def get_search_areas():
-    areas = current_app.property_service.get_search_areas()
+    service = current_app.property_service
+    areas = await service.property_repository.run(service.get_search_areas)
 
     return jsonify({"areas": areas}), 200
@@ -0,0 +1,57 @@
+"""
+Streaming JSON responses
+"""
+import itertools
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List
+
+from quart import Response, request  # type: ignore
+from quart.json import dumps  # type: ignore
+
+NDJSON = "application/x-ndjson"
+# Number of items encoded per chunk of the response
+CHUNK_SIZE = 200
+
+
+Run = Callable[..., Awaitable[Any]]
+
+
+async def _call(func, *args):
+    return func(*args)
+
+
+def stream_json(items: Iterable, run: Run = _call) -> Response:
+    """Stream the items as JSON array while they are produced.
+
+    Clients which prefer ``application/x-ndjson`` get one JSON document per
+    line instead. Every chunk is read from the items with ``run``, e.g. the
+    run method of the repository they come from.
+    """
+    mimetypes = ["application/json", NDJSON]
+    if request.accept_mimetypes.best_match(mimetypes) == NDJSON:
+        return Response(_ndjson(items, run), mimetype=NDJSON)
+    return Response(_json_array(items, run), mimetype="application/json")
+
+
+def _take(items: Iterator) -> List:
+    return list(itertools.islice(items, CHUNK_SIZE))
+
+
+async def _chunks(items: Iterable, run: Run) -> AsyncIterator[List]:
+    items = iter(items)
+    chunk = await run(_take, items)
+    while chunk:
+        yield chunk
+        chunk = await run(_take, items)
+
+
+async def _json_array(items: Iterable, run: Run = _call) -> AsyncIterator[bytes]:
+    separator = "["
+    async for chunk in _chunks(items, run):
+        yield (separator + ",".join(map(dumps, chunk))).encode()
+        separator = ","
+    yield b"]" if separator == "," else b"[]"
+
+
+async def _ndjson(items: Iterable, run: Run = _call) -> AsyncIterator[bytes]:
+    async for chunk in _chunks(items, run):
+        yield "".join(dumps(item) + "\n" for item in chunk).encode()
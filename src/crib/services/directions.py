@@ -2,25 +2,63 @@
 Directions service
 """
 import abc
+import asyncio
 import datetime
+import functools
+import itertools
 import logging
-import operator
-from typing import Any, Dict, Iterable, Type, TypeVar
+import random
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 import cmocean  # type: ignore
 import numpy  # type: ignore
 import requests_async as requests  # type: ignore
-from matplotlib.colors import rgb2hex  # type: ignore
 
 import crib
 from crib import exceptions, injection, plugins
 from crib.domain import Direction, Location, map_analysis
 
+from . import ratelimit
+
 log = logging.getLogger(__name__)
 
+Progress = Callable[[int, int], None]
+
+# Decimal places of raster cell coordinates (~0.1m)
+GRID_PRECISION = 6
+# Decimal places of coordinates for cached routes (~10m)
+ROUTE_PRECISION = 4
+# Arrival times within 15 minutes share cached routes
+ARRIVAL_BUCKET = 15 * 60
+WEEK = 7 * 24 * 60 * 60
+# Colors of the lookup tables of the color maps
+COLORMAP_SIZE = 256
+# Durations colored at once
+COLOR_CHUNK = 1024
+
 
 class DirectionsService(plugins.Plugin):
     directions_repository = injection.Dependency()
+    route_cache = injection.Dependency()
+    process_pool = injection.Dependency()
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._estimator: Optional[Tuple[int, Any]] = None
 
     @classmethod
     def config_schema(cls) -> Dict[str, Any]:
@@ -55,6 +93,39 @@ class DirectionsService(plugins.Plugin):
                     },
                     "latsamples": {"type": "float", "required": True},
                     "lngsamples": {"type": "float", "required": True},
+                    "sampling": {
+                        "type": "dict",
+                        "default": {},
+                        "schema": {
+                            "mode": {
+                                "type": "string",
+                                "allowed": ["uniform", "adaptive"],
+                                "default": "uniform",
+                            },
+                            "threshold": {"type": "integer", "min": 0, "default": 300},
+                            "depth": {"type": "integer", "min": 0, "default": 3},
+                        },
+                    },
+                },
+            },
+            "fetch": {
+                "type": "dict",
+                "default": {},
+                "schema": {
+                    "max-concurrency": {"type": "integer", "min": 1, "default": 8},
+                    "requests-per-second": {
+                        "type": "float",
+                        "min": 0.01,
+                        "default": 10.0,
+                    },
+                    "retries": {"type": "integer", "min": 0, "default": 3},
+                    "backoff": {"type": "float", "min": 0, "default": 1.0},
+                    "max-age": {
+                        "type": "integer",
+                        "min": 0,
+                        "nullable": True,
+                        "default": None,
+                    },
                 },
             },
         }
@@ -63,88 +134,411 @@ class DirectionsService(plugins.Plugin):
     async def to_work(self, origin: Location, mode: str) -> Dict:
         return {}
 
-    async def fetch_map_to_work(self, mode: str) -> None:
-        for i, ll in list(enumerate(self.raster_map())):
-            log.info("Fetching #%s", i)
-            route = await self.to_work(Location(**ll), mode)
+    def arrival_time(self) -> int:
+        """Timestamp of the arrival at work used for routing."""
+        return next_monday_morning()
+
+    async def cached_to_work(
+        self,
+        origin: Location,
+        mode: str,
+        refresh: bool = False,
+        limiter: Optional[ratelimit.TokenBucket] = None,
+    ) -> Dict:
+        """Return the route to work, using the route cache if possible.
+
+        Args:
+            origin: The start of the route.
+            mode: The travel mode.
+            refresh: Fetch the route even if it is cached.
+            limiter: Limits the routes fetched on cache misses.
+        """
+        cache = self.route_cache
+        key = self._route_key(origin, mode)
+        if not refresh:
+            route = await cache.run(cache.get, key)
+            if route is not None:
+                return route
+
+        if limiter is not None:
+            await limiter.acquire()
+        route = await self.to_work(origin, mode)
+        if route:
+            # empty routes are not cached, a route might be found later
+            await cache.run(cache.put, key, route)
+        return route
+
+    def _route_key(self, origin: Location, mode: str) -> str:
+        work = Location(**self.config["work-location"])
+        # The same time of the week, regardless of the week
+        arrival_bucket = self.arrival_time() % WEEK // ARRIVAL_BUCKET
+        coords = ",".join(
+            f"{c:.{ROUTE_PRECISION}f}"
+            for c in (
+                origin.latitude,
+                origin.longitude,
+                work.latitude,
+                work.longitude,
+            )
+        )
+        return f"{mode}:{coords}:{arrival_bucket}"
+
+    async def fetch_map_to_work(
+        self, mode: str, progress: Optional[Progress] = None
+    ) -> None:
+        """Fetch and store the routes to work for the points of the raster map.
+
+        Points that were already fetched for the given mode are skipped, unless
+        they are older than ``max-age`` days. Every point is stored as soon as
+        it is fetched, so an interrupted run resumes where it stopped.
+
+        With ``adaptive`` sampling only a coarse grid is fetched at first. Cells
+        are subdivided while the durations at their corners differ by more than
+        the sampling threshold.
+
+        Up to ``max-concurrency`` requests are in flight at once and no more
+        than ``requests-per-second`` are started. Transient errors are retried
+        with exponential backoff.
+
+        Args:
+            mode: The travel mode.
+            progress: Called with the number of processed and total points.
+        """
+        limiter = ratelimit.TokenBucket(self.config["fetch"]["requests-per-second"])
+        if self.config["search-area"]["sampling"]["mode"] == "adaptive":
+            await self._fetch_adaptive(mode, limiter, progress)
+        else:
+            origins = [grid_cell(Location(**ll)) for ll in self.raster_map()]
+            await self._fetch_origins(origins, mode, limiter, progress)
+
+    async def _fetch_adaptive(
+        self, mode: str, limiter: ratelimit.TokenBucket, progress: Optional[Progress]
+    ) -> None:
+        lats, lngs = self._lattice()
+        sampling = self.config["search-area"]["sampling"]
+        step = 2 ** sampling["depth"]
+
+        def origin(i, j):
+            return grid_cell(Location(latitude=lats[i], longitude=lngs[j]))
+
+        cells = [
+            (i, min(i + step, len(lats) - 1), j, min(j + step, len(lngs) - 1))
+            for i in range(0, len(lats) - 1, step)
+            for j in range(0, len(lngs) - 1, step)
+        ]
+        done = 0
+        total = 0
+
+        def level_progress(level_done, level_total):
+            if progress:
+                progress(done + level_done, total + level_total)
+
+        while cells:
+            corners = {origin(i, j) for cell in cells for i, j in _corners(cell)}
+            origins = sorted(corners, key=lambda o: (o.latitude, o.longitude))
+            fetched = await self._fetch_origins(origins, mode, limiter, level_progress)
+            done += fetched
+            total += fetched
+
+            durations = self.directions_repository.get_cell_durations(mode)
+            cells = [
+                subcell
+                for cell in cells
+                if _needs_refinement(
+                    [durations.get(origin(i, j)) for i, j in _corners(cell)],
+                    sampling["threshold"],
+                )
+                for subcell in _subdivide(cell)
+            ]
+            log.info("Refining %s cells", len(cells))
+
+    async def _fetch_origins(
+        self,
+        origins: List[Location],
+        mode: str,
+        limiter: ratelimit.TokenBucket,
+        progress: Optional[Progress] = None,
+    ) -> int:
+        origins, stale = self._missing_cells(origins, mode)
+        total = len(origins)
+        pending = iter(origins)
+        done = 0
+
+        async def worker():
+            nonlocal done
+            for origin in pending:
+                refresh = origin in stale
+                route = await self._to_work_retrying(origin, mode, limiter, refresh)
+                if route is not None:
+                    self._store_cell(origin, mode, route)
+                done += 1
+                log.info("Fetched %s/%s", done, total)
+                if progress:
+                    progress(done, total)
+
+        workers = [
+            asyncio.ensure_future(worker())
+            for _ in range(self.config["fetch"]["max-concurrency"])
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+        return total
+
+    def _missing_cells(
+        self, origins: List[Location], mode: str
+    ) -> Tuple[List[Location], Set[Location]]:
+        fetched = self.directions_repository.get_fetched_cells(mode)
+        max_age = self.config["fetch"]["max-age"]
+        if max_age is None:
+            cutoff = datetime.datetime.min
+        else:
+            cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=max_age)
+
+        missing = [o for o in origins if fetched.get(o, cutoff) <= cutoff]
+        stale = {o for o in missing if o in fetched}
+        log.info("%s of %s raster points need fetching", len(missing), len(origins))
+        return missing, stale
+
+    async def _to_work_retrying(
+        self,
+        origin: Location,
+        mode: str,
+        limiter: ratelimit.TokenBucket,
+        refresh: bool = False,
+    ) -> Optional[Dict]:
+        retries = self.config["fetch"]["retries"]
+        backoff = self.config["fetch"]["backoff"]
+        attempt = 0
+        while True:
+            try:
+                return await self.cached_to_work(origin, mode, refresh, limiter)
+            except exceptions.TransientDirectionsError as err:
+                if attempt >= retries:
+                    log.error("Giving up on %s: %s", origin, err)
+                    return None
+                delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                log.warning(
+                    "Fetching %s failed: %s. Retry in %.1fs", origin, err, delay
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _store_cell(self, origin: Location, mode: str, route: Dict) -> None:
+        direction = None
+        if route:
             try:
-                d = Direction.fromdict(route)
+                direction = Direction.fromdict(route)
             except Exception as err:
                 log.info("%s", err)
-            else:
-                self.directions_repository.insert(d)
+        self.directions_repository.insert_cell(origin, mode, direction)
 
     def raster_map(self) -> Iterable[Dict]:
+        lats, lngs = self._lattice()
+        for lat in lats:
+            for lng in lngs:
+                yield {"latitude": lat, "longitude": lng}
+
+    def _lattice(self) -> Tuple[List[float], List[float]]:
         ne = self.config["search-area"]["northEast"]
         sw = self.config["search-area"]["southWest"]
         latsamples = self.config["search-area"]["latsamples"]
         lngsamples = self.config["search-area"]["lngsamples"]
         latdelta = ne["lat"] - sw["lat"]
         lngdelta = ne["lng"] - sw["lng"]
-        for lat in frange(sw["lat"], ne["lat"], latdelta / latsamples):
-            for lng in frange(sw["lng"], ne["lng"], lngdelta / lngsamples):
-                yield {"latitude": lat, "longitude": lng}
+        lats = list(frange(sw["lat"], ne["lat"], latdelta / latsamples))
+        lngs = list(frange(sw["lng"], ne["lng"], lngdelta / lngsamples))
+        return lats, lngs
 
     def to_work_durations(
         self, colormap: str, maxDuration: int
-    ) -> Iterable[Dict[str, Any]]:
-        try:
-            cmap = cmocean.cm.cmap_d[colormap]
-        except KeyError:
-            raise ValueError(f"Invalid color map {colormap}")
-
-        getDuration = operator.itemgetter("durationValue")
-        durations = [
-            dur
-            for dur in self.directions_repository.get_to_work_durations()
-            if getDuration(dur) < maxDuration
-        ]
-        if not durations:
-            return durations
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the durations below maxDuration colored by the colormap.
 
-        maxD = getDuration(max(durations, key=getDuration))
-        minD = getDuration(min(durations, key=getDuration))
-
-        colors = self._color_values(minD, maxD, cmap)
-
-        offset = minD + 1
-        for d in durations:
-            v = d["durationValue"]
-            d["color"] = colors[v - offset]
-        log.debug("Fetched %s durations", len(durations))
+        The durations are read twice, first into an array for their range and
+        then in chunks to color them, so their dicts are never all in memory.
+        """
+        colors = colormap_lut(colormap)
 
-        return durations
+        repo = self.directions_repository
+        values = numpy.fromiter(
+            (d["durationValue"] for d in repo.get_to_work_durations()), dtype=float
+        )
+        values = values[values < maxDuration]
+        if not values.size:
+            return iter([])
+        minD = values.min()
+        maxD = values.max()
+        scale = (len(colors) - 1) / max(maxD - minD, 1)
+
+        def colored():
+            count = 0
+            durations = (
+                d
+                for d in repo.get_to_work_durations()
+                if d["durationValue"] < maxDuration
+            )
+            while True:
+                chunk = list(itertools.islice(durations, COLOR_CHUNK))
+                if not chunk:
+                    break
+                values = numpy.fromiter(
+                    (d["durationValue"] for d in chunk), dtype=float, count=len(chunk)
+                )
+                # clamp durations stored after the range was read
+                indexes = numpy.rint((numpy.clip(values, minD, maxD) - minD) * scale)
+                for d, color in zip(chunk, colors[indexes.astype(int)].tolist()):
+                    d["color"] = color
+                    yield d
+                count += len(chunk)
+            log.debug("Fetched %s durations", count)
+
+        return colored()
+
+    def estimate_durations(self, locations: Iterable[Location]) -> List[Optional[int]]:
+        """Estimate the durations to work in seconds from the locations.
+
+        The durations are interpolated between the fetched raster points.
+        Locations outside of the raster are estimated as None. The interpolator
+        is built once per version of the directions.
+        """
+        coords = [[loc.latitude, loc.longitude] for loc in locations]
+        estimator = self._duration_estimator()
+        if estimator is None or not coords:
+            return [None] * len(coords)
+        estimates = estimator(numpy.array(coords, dtype=float))
+        return [None if numpy.isnan(e) else int(round(e)) for e in estimates]
+
+    def _duration_estimator(self):
+        repo = self.directions_repository
+        version = repo.directions_version()
+        if self._estimator is not None and self._estimator[0] == version:
+            return self._estimator[1]
+
+        points = []
+        values = []
+        for d in repo.get_to_work_durations():
+            points.append(d["location"])
+            values.append(d["durationValue"])
+        estimator = None
+        if points:
+            estimator = map_analysis.duration_estimator(points, values)
+        self._estimator = (version, estimator)
+        return estimator
 
     def colormaps(self) -> Iterable[str]:
         return list(cmocean.cm.cmap_d.keys())
 
-    @staticmethod
-    def _color_values(minV, maxV, colormap):
-        delta = maxV - minV
-        colormap = colormap._resample(delta)
-        rgb_values = colormap(numpy.arange(delta))[:, :-1]
-        hex_values = [rgb2hex(rgb) for rgb in rgb_values]
-        return hex_values
-
     def get_area(self, max_duration=43 * 60, alpha=None, hullbuffer=None):
-        area = self.directions_repository.get_to_work_area(max_duration)
-        if area:
-            return area
-
-        directions = [
-            [d["location"][1], d["location"][0]]
-            for d in self.directions_repository.get_to_work_durations()
-            if d["durationValue"] <= max_duration
-        ]
-        area = map_analysis.get_area(directions, alpha, hullbuffer)
-        self.directions_repository.insert_to_work_area(
-            max_duration=max_duration, area=area
+        return self.get_areas([max_duration], alpha, hullbuffer)[max_duration]
+
+    async def get_area_async(self, max_duration=43 * 60, alpha=None, hullbuffer=None):
+        areas = await self.get_areas_async([max_duration], alpha, hullbuffer)
+        return areas[max_duration]
+
+    def get_areas(
+        self, max_durations: Iterable[int], alpha=None, hullbuffer=None
+    ) -> Dict[int, Any]:
+        """Return the areas reachable within each of the maximum durations.
+
+        Areas which are not stored for the current directions, alpha and
+        hullbuffer are computed in one pass over the durations and stored.
+        """
+        areas, job = self._missing_areas(max_durations, alpha, hullbuffer)
+        if job is not None:
+            computed = self.process_pool.call(
+                job.key, map_analysis.get_areas, *job.args
+            )
+            self._store_areas(areas, job, computed)
+        return areas
+
+    async def get_areas_async(
+        self, max_durations: Iterable[int], alpha=None, hullbuffer=None
+    ) -> Dict[int, Any]:
+        """Like :meth:`get_areas`, but don't block the event loop.
+
+        The repository is accessed through its run method and the areas are
+        awaited while the process pool computes them.
+        """
+        repo = self.directions_repository
+        areas, job = await repo.run(
+            self._missing_areas, max_durations, alpha, hullbuffer
+        )
+        if job is not None:
+            computed = await self.process_pool.run(
+                job.key, map_analysis.get_areas, *job.args
+            )
+            await repo.run(self._store_areas, areas, job, computed)
+        return areas
+
+    def _missing_areas(
+        self, max_durations: Iterable[int], alpha=None, hullbuffer=None
+    ) -> Tuple[Dict[int, Any], Optional["AreaJob"]]:
+        """Return the stored areas and the job computing the missing ones."""
+        alpha = alpha or map_analysis.DEFAULT_ALPHA
+        if hullbuffer is None:
+            hullbuffer = map_analysis.DEFAULT_HULLBUFFER
+        repo = self.directions_repository
+
+        areas = {
+            max_duration: repo.get_to_work_area(max_duration, alpha, hullbuffer)
+            for max_duration in max_durations
+        }
+        missing = [max_duration for max_duration, area in areas.items() if not area]
+        if not missing:
+            return areas, None
+
+        version = repo.directions_version()
+        durations = repo.get_to_work_durations()
+        if self.config["search-area"]["sampling"]["mode"] == "adaptive":
+            durations = self._resample_durations(durations)
+        directions = []
+        values = []
+        for d in durations:
+            directions.append([d["location"][1], d["location"][0]])
+            values.append(d["durationValue"])
+        job = AreaJob(version, directions, values, missing, alpha, hullbuffer)
+        return areas, job
+
+    def _store_areas(
+        self, areas: Dict[int, Any], job: "AreaJob", computed: List[Any]
+    ) -> None:
+        for max_duration, area in zip(job.missing, computed):
+            self.directions_repository.insert_to_work_area(
+                max_duration=max_duration,
+                area=area,
+                alpha=job.alpha,
+                hullbuffer=job.hullbuffer,
+                version=job.version,
+            )
+            areas[max_duration] = area
+
+    def _resample_durations(self, durations: Iterable[Dict]) -> List[Dict]:
+        """Interpolate adaptively sampled durations onto the full raster.
+
+        Coarse cells of adaptive sampling would otherwise be cut out of the
+        area by the alpha shape.
+        """
+        durations = list(durations)
+        if len(durations) < 3:
+            return durations
+        lats, lngs = self._lattice()
+        points = [d["location"] for d in durations]
+        values = [d["durationValue"] for d in durations]
+        locations, interpolated = map_analysis.interpolate_grid(
+            points, values, lats, lngs
         )
-        return area
+        return [
+            {"location": list(loc), "durationValue": value}
+            for loc, value in zip(locations, interpolated)
+        ]
 
 
 class GoogleDirections(DirectionsService):
     _URL = "https://maps.googleapis.com/maps/api/directions/json"
+    _TRANSIENT_STATUSES = ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR")
 
     @classmethod
     def config_schema(cls) -> Dict[str, Any]:
@@ -160,10 +554,15 @@ class GoogleDirections(DirectionsService):
             "key": key,
             "origin": ",".join((str(origin.latitude), str(origin.longitude))),
             "destination": ",".join((str(work.latitude), str(work.longitude))),
-            "arrival_time": next_monday_morning(),
+            "arrival_time": self.arrival_time(),
             "mode": mode,
         }
-        response = await requests.get(self._URL, args)
+        try:
+            response = await requests.get(self._URL, args)
+        except OSError as err:
+            raise exceptions.TransientDirectionsError(err)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise exceptions.TransientDirectionsError(response.status_code)
         response.raise_for_status()
 
         data = response.json()
@@ -171,6 +570,8 @@ class GoogleDirections(DirectionsService):
             if data["status"] == "ZERO_RESULTS":
                 log.warning("Zero results for %s", origin)
                 return {}
+            if data["status"] in self._TRANSIENT_STATUSES:
+                raise exceptions.TransientDirectionsError(data)
             raise exceptions.DirectionsError(data)
         route = data["routes"][0]["legs"][0]
         route["overview_polyline"] = data["routes"][0]["overview_polyline"]
@@ -178,6 +579,27 @@ class GoogleDirections(DirectionsService):
         return route
 
 
+class AreaJob(NamedTuple):
+    """The computation of the areas missing for a version of the directions."""
+
+    version: int
+    directions: List[List[float]]
+    values: List[int]
+    missing: List[int]
+    alpha: int
+    hullbuffer: float
+
+    @property
+    def key(self) -> Hashable:
+        # concurrent requests for the same areas share the computation
+        return ("areas", self.version, tuple(self.missing), self.alpha, self.hullbuffer)
+
+    @property
+    def args(self) -> Tuple:
+        """The arguments of :func:`map_analysis.get_areas`."""
+        return self.directions, self.values, self.missing, self.alpha, self.hullbuffer
+
+
 DS = TypeVar("DS", bound=DirectionsService)
 TDS = Type[DS]
 
@@ -187,6 +609,23 @@ def crib_add_directions_services() -> Iterable[TDS]:
     return [GoogleDirections]
 
 
+@functools.lru_cache(maxsize=None)
+def colormap_lut(name: str) -> numpy.ndarray:
+    """Hex colors of the color map, evenly spaced from its first to last color.
+
+    The lookup tables are cached per color map.
+    """
+    try:
+        cmap = cmocean.cm.cmap_d[name]
+    except KeyError:
+        raise ValueError(f"Invalid color map {name}")
+    rgba = cmap(numpy.linspace(0.0, 1.0, COLORMAP_SIZE), bytes=True)
+    lut = numpy.array(["#%02x%02x%02x" % tuple(rgb) for rgb in rgba[:, :3]])
+    # shared by all requests
+    lut.flags.writeable = False
+    return lut
+
+
 def frange(x, y, jump=1.0):
     """Range for floats
 
@@ -203,6 +642,49 @@ def frange(x, y, jump=1.0):
         yield x
 
 
+def grid_cell(origin: Location) -> Location:
+    """Quantize a location so that it identifies a raster cell."""
+    return Location(
+        latitude=round(origin.latitude, GRID_PRECISION),
+        longitude=round(origin.longitude, GRID_PRECISION),
+    )
+
+
+Cell = Tuple[int, int, int, int]
+
+
+def _corners(cell: Cell) -> List[Tuple[int, int]]:
+    i0, i1, j0, j1 = cell
+    return [(i0, j0), (i0, j1), (i1, j0), (i1, j1)]
+
+
+def _subdivide(cell: Cell) -> List[Cell]:
+    """Split a cell of lattice indices in half along each axis where possible."""
+    i0, i1, j0, j1 = cell
+
+    def halves(start, stop):
+        if stop - start < 2:
+            return [(start, stop)]
+        mid = (start + stop) // 2
+        return [(start, mid), (mid, stop)]
+
+    ihalves = halves(i0, i1)
+    jhalves = halves(j0, j1)
+    if len(ihalves) == len(jhalves) == 1:
+        return []
+    return [(a, b, c, d) for a, b in ihalves for c, d in jhalves]
+
+
+def _needs_refinement(durations: List[Optional[int]], threshold: int) -> bool:
+    known = [d for d in durations if d is not None]
+    if not known:
+        return False
+    if len(known) < len(durations):
+        # edge of the reachable area
+        return True
+    return max(known) - min(known) > threshold
+
+
 def next_monday_morning():
     date = datetime.datetime.utcnow()
     day = 0  # monday
@@ -0,0 +1,82 @@
+"""
+Process pool for CPU heavy work
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from crib import plugins
+
+
+class ProcessPool(plugins.Plugin):
+    """Run CPU heavy functions in worker processes.
+
+    The functions and their arguments have to be picklable. While a call is
+    running, calls with the same key share its result instead of computing it
+    again. With ``max-workers`` 0 the functions are called in the calling
+    thread.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        # reentrant, as callbacks of finished futures run immediately
+        self._lock = threading.RLock()
+        self._pending: Dict[Hashable, concurrent.futures.Future] = {}
+
+    @classmethod
+    def config_schema(cls) -> Dict[str, Any]:
+        return {
+            # Empty for the number of processors
+            "max-workers": {
+                "type": "integer",
+                "min": 0,
+                "nullable": True,
+                "default": None,
+            }
+        }
+
+    def submit(
+        self, key: Optional[Hashable], func: Callable, *args
+    ) -> concurrent.futures.Future:
+        """Start ``func(*args)`` unless a call with the same key is running.
+
+        Calls with a key of None are never shared.
+        """
+        with self._lock:
+            if key is not None and key in self._pending:
+                return self._pending[key]
+            future = self._start(func, *args)
+            if key is not None:
+                self._pending[key] = future
+                future.add_done_callback(lambda f: self._forget(key, f))
+            return future
+
+    def call(self, key: Optional[Hashable], func: Callable, *args) -> Any:
+        """Return the result of ``func(*args)``, waiting for it."""
+        return self.submit(key, func, *args).result()
+
+    async def run(self, key: Optional[Hashable], func: Callable, *args) -> Any:
+        """Return the result of ``func(*args)`` without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(key, func, *args))
+
+    def _start(self, func: Callable, *args) -> concurrent.futures.Future:
+        if self.config["max-workers"] == 0:
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as err:
+                future.set_exception(err)
+            return future
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.config["max-workers"]
+            )
+        return self._executor.submit(func, *args)
+
+    def _forget(self, key: Hashable, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
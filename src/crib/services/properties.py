@@ -1,52 +1,192 @@
+import base64
+import binascii
+import datetime
+import itertools
+import json
 import logging
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 
 from crib import exceptions, injection, plugins
+from crib.domain import Direction
 
 log = logging.getLogger(__name__)
 
+PAGE_SIZE = 500
+# Properties whose commute is estimated at once
+ESTIMATE_BATCH = 200
+
 
 class PropertyService(plugins.Plugin):
     directions_service = injection.Dependency()
+    directions_repository = injection.Dependency()
     property_repository = injection.Dependency()
 
-    def find(self, max_price=None, favorite=None, area=None, limit=None):
+    def iter_find(
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        max_duration=None,
+        sort=None,
+    ) -> Iterator:
+        """Find properties and yield them as they are read."""
         try:
-            props = list(
+            return iter(
                 self.property_repository.find(
-                    max_price=max_price, favorite=favorite, area=area, limit=limit
+                    max_price=max_price,
+                    favorite=favorite,
+                    area=area,
+                    limit=limit,
+                    projection=projection,
+                    max_duration=max_duration,
+                    sort=sort,
                 )
             )
         except exceptions.InvalidQuery as err:
             raise ValueError(str(err))
 
-        return props
-
-    async def to_work(self, prop_id: str, mode: str, refresh: bool = False):
-        prop = self.property_repository.get(prop_id)
-
-        if prop.toWork and not refresh:
-            return prop.toWork
-
-        origin = prop.location
-
-        route = await self.directions_service.to_work(origin, mode)
-
-        prop = prop.replace(toWork=route)
-        self.property_repository.update(prop)
+    def with_durations(self, props: Iterable) -> Iterator[Tuple]:
+        """Pair the properties with their estimated duration to work.
+
+        The durations are estimated in batches, see
+        :meth:`DirectionsService.estimate_durations`.
+        """
+        props = iter(props)
+        while True:
+            batch = list(itertools.islice(props, ESTIMATE_BATCH))
+            if not batch:
+                return
+            durations = self.directions_service.estimate_durations(
+                p.location for p in batch
+            )
+            yield from zip(batch, durations)
+
+    def estimate_durations(self, props: Iterable) -> Iterator:
+        """Set the estimated duration to work of the properties."""
+        for prop, duration in self.with_durations(props):
+            yield prop.replace(toWorkDuration=duration)
+
+    def complete_durations(self, props: Iterable) -> Iterator:
+        """Estimate the durations to work the properties are missing.
+
+        Properties with a stored duration are passed on unchanged.
+        """
+        props = iter(props)
+        while True:
+            batch = list(itertools.islice(props, ESTIMATE_BATCH))
+            if not batch:
+                return
+            missing = [p for p in batch if p.toWorkDuration is None]
+            durations = {}
+            if missing:
+                estimates = self.directions_service.estimate_durations(
+                    p.location for p in missing
+                )
+                durations = {p.id: d for p, d in zip(missing, estimates)}
+            for prop in batch:
+                if durations.get(prop.id) is not None:
+                    prop = prop.replace(toWorkDuration=durations[prop.id])
+                yield prop
+
+    def update_durations(self, unestimated: bool = False) -> int:
+        """Estimate the duration to work of all stored properties again.
+
+        Run this whenever the directions change. With ``unestimated`` only
+        properties whose duration was never estimated are updated. Returns
+        the number of updated properties.
+        """
+        repo = self.property_repository
+        pairs = self.with_durations(repo.get_all(unestimated=unestimated))
+        count = 0
+        while True:
+            batch = {p.id: d for p, d in itertools.islice(pairs, ESTIMATE_BATCH)}
+            if not batch:
+                return count
+            repo.set_durations(batch)
+            count += len(batch)
+
+    async def find_page(
+        self,
+        max_price=None,
+        favorite=None,
+        area=None,
+        limit=None,
+        projection=None,
+        cursor: Optional[str] = None,
+        max_duration=None,
+        sort=None,
+    ) -> Tuple[List, Optional[str]]:
+        """Find a page of properties.
+
+        Returns the properties and the cursor of the next page. The cursor is
+        None on the last page.
+        """
+        limit = limit or PAGE_SIZE
+        after = _decode_cursor(cursor, sort) if cursor else None
+        try:
+            props = self.property_repository.find(
+                max_price=max_price,
+                favorite=favorite,
+                area=area,
+                limit=limit,
+                projection=projection,
+                after=after,
+                max_duration=max_duration,
+                sort=sort,
+            )
+        except exceptions.InvalidQuery as err:
+            raise ValueError(str(err))
+        props = await self.property_repository.run(list, props)
+
+        next_cursor = None
+        if len(props) == limit:
+            last = props[-1]
+            if sort == "duration":
+                next_cursor = _encode_cursor(last.toWorkDuration, last.id)
+            else:
+                next_cursor = _encode_cursor(last.firstVisibleDate.isoformat(), last.id)
+        return props, next_cursor
+
+    async def to_work(
+        self, prop_id: str, mode: str, refresh: bool = False
+    ) -> Optional[Direction]:
+        """Return the route from the property to work.
+
+        Routes are stored in the directions repository per property and mode.
+        Returns None if the directions service finds no route.
+        """
+        prop = await self.property_repository.run(self.property_repository.get, prop_id)
+        if prop is None:
+            raise exceptions.EntityNotFound(prop_id)
+
+        directions = self.directions_repository
+        if not refresh:
+            route = await directions.run(directions.get_property_route, prop_id, mode)
+            if route:
+                return route
+            # transit routes stored on the property by older versions
+            if prop.toWork and mode == "transit":
+                return prop.toWork
+
+        data = await self.directions_service.cached_to_work(
+            prop.location, mode, refresh=refresh
+        )
+        if not data:
+            return None
+        route = Direction.fromdict(data)
+        await directions.run(directions.insert_property_route, prop_id, mode, route)
 
         return route
 
-    def favorite(self, prop_id: str, val: bool):
-        prop = self.property_repository.get(prop_id)
-        if prop.favorite != val:
-            prop = prop.replace(favorite=val)
-            self.property_repository.update(prop)
+    async def favorite(self, prop_id: str, val: bool):
+        repo = self.property_repository
+        await repo.run(repo.set_fields, prop_id, favorite=val)
 
-    def ban(self, prop_id: str, val: bool):
-        prop = self.property_repository.get(prop_id)
-        if prop.banned != val:
-            prop = prop.replace(banned=val)
-            self.property_repository.update(prop)
+    async def ban(self, prop_id: str, val: bool):
+        repo = self.property_repository
+        await repo.run(repo.set_fields, prop_id, banned=val)
 
     def clear_properties(self, banned=False, favorites=False):
         self.property_repository.clear(banned=banned, favorites=favorites)
@@ -56,3 +196,18 @@ class PropertyService(plugins.Plugin):
 
     def get_search_areas(self):
         return self.property_repository.get_search_areas()
+
+
+def _encode_cursor(value, identity: str) -> str:
+    data = json.dumps([value, identity]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def _decode_cursor(cursor: str, sort: Optional[str] = None) -> Tuple[Any, str]:
+    try:
+        value, identity = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "duration":
+            return int(value), str(identity)
+        return datetime.datetime.fromisoformat(value), str(identity)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError(f"Invalid cursor {cursor!r}")
@@ -0,0 +1,41 @@
+"""
+Rate limiting for calls to external services
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Limit operations to a number of calls per second.
+
+    Tokens are refilled continuously at ``rate`` per second. Up to ``capacity``
+    tokens can accumulate, which allows short bursts.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("Rate has to be positive.")
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
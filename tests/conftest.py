@@ -1,6 +1,19 @@
+import os
+
 import pytest  # type: ignore
 
 from crib import app, config, injection
+from crib.plugin_loader import ConfiguredPluginProvider, hook
+from crib.scraper import Scraper
+from crib.services.auth import AuthService
+from crib.services.pool import ProcessPool
+from crib.services.properties import PropertyService
+from crib.services.scrape import ScrapeService
+
+benchmark = pytest.mark.skipif(
+    not os.environ.get("CRIB_BENCHMARK"),
+    reason="Benchmarks only run if CRIB_BENCHMARK is set.",
+)
 
 
 def make_app(cfg=None):
@@ -13,6 +26,29 @@ def make_app(cfg=None):
     return Container
 
 
+def make_isolated_app(cfg=None):
+    """Like make_app, but the container class caches its own components.
+
+    The providers of AppContainer cache components for every container and
+    the components refer to their container, so containers using them stay
+    alive until the end of the test session.
+    """
+
+    class Container(make_app(cfg)):
+        directions_service = ConfiguredPluginProvider(hook.crib_add_directions_services)
+        directions_repository = ConfiguredPluginProvider(hook.crib_add_directions_repos)
+        route_cache = ConfiguredPluginProvider(hook.crib_add_route_caches)
+        process_pool = injection.SingletonProvider(ProcessPool)
+        user_repository = ConfiguredPluginProvider(hook.crib_add_user_repos)
+        property_service = injection.SingletonProvider(PropertyService)
+        property_repository = ConfiguredPluginProvider(hook.crib_add_property_repos)
+        auth_service = injection.SingletonProvider(AuthService)
+        scrape = injection.SingletonProvider(Scraper)
+        scrape_service = injection.SingletonProvider(ScrapeService)
+
+    return Container
+
+
 @pytest.fixture
 def testapp():
     return make_app(
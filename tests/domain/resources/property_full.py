@@ -35,5 +35,6 @@ data = {
         "traffic_speed_entry": (),
         "via_waypoint": (),
     },
+    "toWorkDuration": 2473,
     "transactionType": "rent",
 }
@@ -42,5 +42,6 @@ initialized = {
     "students": False,
     "summary": "<h3>Full description</h3>",
     "toWork": None,
+    "toWorkDuration": None,
     "transactionType": "rent",
 }
@@ -0,0 +1,189 @@
+"""Tests for the map analysis.
+"""
+import time
+
+import numpy as np  # type: ignore
+import pytest  # type: ignore
+from scipy.spatial import Delaunay  # type: ignore
+from shapely import geometry  # type: ignore
+from shapely.ops import unary_union  # type: ignore
+
+from crib.domain import map_analysis
+
+from ..conftest import benchmark
+
+
+def grid(x0, y0, size, samples):
+    xs = np.linspace(x0, x0 + size, samples)
+    ys = np.linspace(y0, y0 + size, samples)
+    return np.array([[x, y] for x in xs for y in ys])
+
+
+def raster(n, seed=0):
+    """Jittered raster of about n points with holes, like fetched directions."""
+    rng = np.random.default_rng(seed)
+    samples = int(np.sqrt(n))
+    points = grid(0, 0, 1, samples)
+    points += rng.normal(scale=0.2 / samples, size=points.shape)
+    for cx, cy, r in rng.random((8, 3)):
+        points = points[np.hypot(points[:, 0] - cx, points[:, 1] - cy) > r / 8]
+    return points, 0.5 * samples
+
+
+def union_of_kept_triangles(points, alpha):
+    """Reference alpha shape from the union of every kept triangle."""
+    triangles = []
+    for simplex in Delaunay(points).simplices:
+        corners = points[simplex]
+        a, b, c = (np.linalg.norm(corners[i] - corners[i - 1]) for i in range(3))
+        triangle = geometry.Polygon(corners)
+        if triangle.area and a * b * c / (4 * triangle.area) < 1 / alpha:
+            triangles.append(triangle)
+    return unary_union(triangles)
+
+
+def test_alpha_shape_square():
+    """Test the alpha shape of a regular grid covers the grid."""
+    points = grid(0, 0, 1, 11)
+
+    shape = map_analysis.alpha_shape(points, alpha=5)
+
+    assert shape.geom_type == "Polygon"
+    assert shape.area == pytest.approx(1.0)
+
+
+def test_alpha_shape_separates_clusters():
+    """Test that big triangles between clusters are removed."""
+    points = np.concatenate([grid(0, 0, 1, 11), grid(3, 0, 1, 11)])
+
+    shape = map_analysis.alpha_shape(points, alpha=5)
+
+    assert shape.geom_type == "MultiPolygon"
+    assert shape.area == pytest.approx(2.0)
+
+
+def test_alpha_shape_concave():
+    """Test that the alpha shape follows concave boundaries."""
+    points = np.array([p for p in grid(0, 0, 1, 11) if p[0] < 0.45 or p[1] < 0.45])
+
+    shape = map_analysis.alpha_shape(points, alpha=5)
+
+    assert shape.contains(geometry.Point(0.2, 0.8))
+    assert shape.contains(geometry.Point(0.8, 0.2))
+    assert not shape.contains(geometry.Point(0.7, 0.7))
+
+
+def test_alpha_shape_collinear():
+    """Test that degenerate triangles are ignored."""
+    points = np.concatenate([grid(0, 0, 1, 11), [[2, 0], [3, 0], [4, 0]]])
+
+    shape = map_analysis.alpha_shape(points, alpha=5)
+
+    assert shape.area == pytest.approx(1.0)
+
+
+def test_alpha_shape_triangle():
+    """Test that the convex hull is used for less than 4 points."""
+    shape = map_analysis.alpha_shape([[0, 0], [1, 0], [0, 1]], alpha=5)
+
+    assert shape.area == pytest.approx(0.5)
+
+
+def test_alpha_shape_boundary():
+    """Test that the boundary method matches the union of kept triangles."""
+    points, alpha = raster(2000)
+
+    shape = map_analysis.alpha_shape(points, alpha)
+
+    expected = union_of_kept_triangles(points, alpha)
+    assert shape.symmetric_difference(expected).area == pytest.approx(0, abs=1e-12)
+
+
+def test_alpha_shape_polygonize():
+    """Test that the polygonize method covers all kept triangles."""
+    points, alpha = raster(2000)
+
+    shape = map_analysis.alpha_shape(points, alpha, method="polygonize")
+
+    expected = union_of_kept_triangles(points, alpha)
+    assert expected.difference(shape).area == pytest.approx(0, abs=1e-12)
+
+
+def test_alpha_shape_invalid_method():
+    """Test passing an unknown method."""
+    with pytest.raises(ValueError):
+        map_analysis.alpha_shape(grid(0, 0, 1, 3), 5, method="foo")
+
+
+@benchmark
+@pytest.mark.parametrize("n", [10000, 50000, 100000])
+def test_benchmark_alpha_shape(n):
+    """Compare the alpha shape methods. Run with -s to see the timings."""
+    points, alpha = raster(n)
+    timings = {}
+    shapes = {}
+    for method in ("polygonize", "boundary"):
+        start = time.perf_counter()
+        shapes[method] = map_analysis.alpha_shape(points, alpha, method=method)
+        timings[method] = time.perf_counter() - start
+
+    print(
+        f"\n{len(points)} points: "
+        + ", ".join(f"{m} {t:.3f}s" for m, t in timings.items())
+        + f", speedup {timings['polygonize'] / timings['boundary']:.1f}x"
+    )
+    assert timings["boundary"] < timings["polygonize"]
+
+
+def test_get_areas_nested():
+    """Test that areas for increasing durations are nested."""
+    points = grid(0, 0, 1, 21)
+    durations = points[:, 0] * 1000 + points[:, 1] * 500
+
+    areas = map_analysis.get_areas(points, durations, [300, 600, 900], alpha=5)
+
+    assert areas[0].area < areas[1].area < areas[2].area
+    for smaller, bigger in zip(areas, areas[1:]):
+        assert smaller.difference(bigger).area == pytest.approx(0, abs=1e-12)
+
+
+def test_get_areas_single_duration():
+    """Test that a single duration gives the same area as get_area."""
+    points = grid(0, 0, 1, 21)
+    durations = points[:, 0] * 1000
+
+    (area,) = map_analysis.get_areas(points, durations, [500], alpha=5)
+
+    expected = map_analysis.get_area(points[durations <= 500].tolist(), alpha=5)
+    assert area.symmetric_difference(expected).area == pytest.approx(0, abs=1e-12)
+
+
+def test_get_areas_empty():
+    """Test durations without any directions."""
+    points = grid(0, 0, 1, 3)
+    durations = np.full(len(points), 1000)
+
+    assert map_analysis.get_areas(points, durations, [10, 20], alpha=5) == [None, None]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3])
+def test_get_areas_few_points(count):
+    """Test areas of less than four, collinear or single, points."""
+    points = [[0, 0], [1, 1], [2, 2]][:count]
+    durations = [100, 200, 300][:count]
+
+    areas = map_analysis.get_areas(points, durations, [100, 300], alpha=5)
+
+    assert all(area.geom_type == "Polygon" for area in areas)
+    assert areas[0].contains(geometry.Point(0, 0))
+    assert areas[1].contains(geometry.Point(*points[-1]))
+
+
+def test_get_areas_triangle():
+    """Test the area of three points which are not collinear."""
+    points = [[0, 0], [1, 1], [0, 1]]
+
+    area, triangle = map_analysis.get_areas(points, [1, 2, 3], [2, 3])
+
+    assert area.geom_type == "Polygon"
+    assert triangle.contains(geometry.Point(0.2, 0.5))
@@ -1,11 +1,21 @@
 """Test basic model functionality."""
+import time
 from datetime import datetime
 
 import attr
+import cattr  # type: ignore
 import pytest  # type: ignore
+from cattr.gen import (  # type: ignore
+    make_dict_structure_fn,
+    make_dict_unstructure_fn,
+    override,
+)
 
 from crib import exceptions
-from crib.domain import model
+from crib.domain import Direction, Property, model
+
+from ..conftest import benchmark
+from .resources import direction_full, property_full
 
 
 @attr.s
@@ -69,3 +79,52 @@ def test_replace(testmodel):
     assert new is not testmodel
     assert new.integer == 43
     assert testmodel.integer == 42
+
+
+def test_fromdict_missing(testdata):
+    """Test that missing attributes are invalid."""
+    del testdata["integer"]
+    with pytest.raises(exceptions.InvalidData):
+        SomeModel.fromdict(testdata)
+
+
+@benchmark
+@pytest.mark.parametrize(
+    "cls, resource", [(Property, property_full), (Direction, direction_full)]
+)
+def test_benchmark_converter(cls, resource):
+    """Compare with the generic converter. Run with -s to see the timings."""
+    data = resource.data
+    generic = cattr.Converter()
+    generic.register_unstructure_hook(datetime, lambda dt: dt)
+    generic.register_structure_hook(datetime, lambda ts, _: ts)
+    # Property stores its route in _toWork, see crib.domain.property
+    rename = {"_toWork": override(rename="toWork")}
+    generic.register_structure_hook(
+        Property, make_dict_structure_fn(Property, generic, **rename)
+    )
+    generic.register_unstructure_hook(
+        Property, make_dict_unstructure_fn(Property, generic, **rename)
+    )
+    rounds = 2000
+
+    rates = {}
+    for name, converter in (("generic", generic), ("model", model.converter)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            obj = converter.structure(data, cls)
+            if cls is Property:
+                # decode the lazily decoded route as well
+                assert isinstance(obj.toWork, Direction)
+            converter.unstructure(obj)
+        rates[name] = rounds / (time.perf_counter() - start)
+
+    print(
+        f"\n{cls.__name__}: "
+        + ", ".join(f"{n} {r:.0f} objects/s" for n, r in rates.items())
+        + f", speedup {rates['model'] / rates['generic']:.1f}x"
+    )
+    assert generic.unstructure(generic.structure(data, cls)) == cls.fromdict(
+        data
+    ).asdict()
+    assert rates["model"] > rates["generic"]
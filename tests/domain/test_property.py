@@ -3,7 +3,8 @@
 import attr
 import pytest  # type: ignore
 
-from crib.domain import Property
+from crib import exceptions
+from crib.domain import Direction, Property
 
 
 @pytest.fixture(scope="session")
@@ -40,3 +41,23 @@ def test_round_trip_minimal(property_minimal):
     prop = Property.fromdict(data)
     result = prop.asdict()
     assert result == initialized
+
+
+def test_to_work_lazy(property_full):
+    """Test that toWork is only decoded on first access."""
+    prop = Property.fromdict(property_full)
+    assert isinstance(prop._toWork, dict)
+
+    assert isinstance(prop.toWork, Direction)
+    assert prop.toWork is prop.toWork
+    assert prop == Property.fromdict(property_full)
+    assert prop.replace(toWork=None).toWork is None
+
+
+def test_to_work_invalid(property_full):
+    """Test that invalid toWork data is reported on access."""
+    data = dict(property_full, toWork={"duration": "soon"})
+    prop = Property.fromdict(data)
+
+    with pytest.raises(exceptions.InvalidData):
+        prop.toWork
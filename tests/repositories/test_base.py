@@ -0,0 +1,29 @@
+"""Tests for the repository base classes.
+"""
+import asyncio
+import threading
+
+from crib import injection
+from crib.repositories import base
+
+from ..conftest import make_isolated_app
+
+
+class ThreadedRepo(base.ThreadedRepo):
+    pass
+
+
+def test_threaded_run():
+    """Test that calls run in the thread pool of the repository."""
+
+    class Container(make_isolated_app({"repo": {"max-workers": 2}})):
+        repo = injection.SingletonProvider(ThreadedRepo)
+
+    repo = Container().repo
+    run = repo.run(lambda x: (x, threading.current_thread()), 42)
+
+    result, thread = asyncio.get_event_loop().run_until_complete(run)
+
+    assert result == 42
+    assert thread is not threading.current_thread()
+    assert thread.name.startswith("ThreadedRepo")
@@ -0,0 +1,349 @@
+"""Tests for the property repositories.
+"""
+import datetime
+import random
+import time
+
+import attr
+import pytest  # type: ignore
+from shapely import geometry  # type: ignore
+
+from crib import exceptions
+from crib.domain import Location, Property, PropertySummary
+from crib.repositories import properties
+
+from ..conftest import make_isolated_app
+from ..domain.resources.property_full import data as property_data
+
+
+def make_prop(i, lat, lng, **changes):
+    prop = Property.fromdict(property_data)
+    return prop.replace(id=f"P-{i}", location=Location(lat, lng), **changes)
+
+
+@pytest.fixture
+def repo():
+    testapp = make_isolated_app(
+        {"property_repository": {"type": "MemoryPropertyRepo"}}
+    )()
+    return testapp.property_repository
+
+
+@pytest.fixture
+def props(repo):
+    rnd = random.Random(0)
+    props = [
+        make_prop(i, 51 + rnd.random() * 0.2, rnd.random() * 0.2) for i in range(500)
+    ]
+    for p in props:
+        repo.insert(p)
+    return props
+
+
+def in_area(props, area):
+    return {
+        p.id
+        for p in props
+        if area.contains(geometry.Point(p.location.longitude, p.location.latitude))
+    }
+
+
+def test_find_area(repo, props):
+    """Test finding properties within an area."""
+    area = geometry.Point(0.1, 51.1).buffer(0.05)
+
+    found = {p.id for p in repo.find(area=area, limit=1000)}
+
+    assert found == in_area(props, area)
+    assert found
+
+
+def test_find_area_after_changes(repo, props):
+    """Test that the index follows updates and deletes."""
+    area = geometry.box(0.0, 51.0, 0.1, 51.1)
+    moved = props[0].replace(location=Location(51.05, 0.05))
+    repo.update(moved)
+    repo.delete(props[1].id)
+    props = [moved] + props[2:]
+
+    found = {p.id for p in repo.find(area=area, limit=1000)}
+
+    assert found == in_area(props, area)
+    assert moved.id in found
+
+
+@pytest.fixture
+def priced(repo):
+    rnd = random.Random(1)
+    props = []
+    for i in range(300):
+        prop = make_prop(i, 51 + rnd.random() * 0.2, rnd.random() * 0.2)
+        props.append(
+            prop.replace(
+                price=attr.evolve(prop.price, amount=rnd.randrange(800, 2500, 50)),
+                firstVisibleDate=datetime.datetime(2019, 1, 1)
+                + datetime.timedelta(hours=rnd.randrange(5000)),
+            )
+        )
+    for p in props:
+        repo.insert(p)
+    return props
+
+
+def newest(props, max_price, limit):
+    props = [p for p in props if p.price.amount <= max_price]
+    props.sort(key=lambda p: p.firstVisibleDate, reverse=True)
+    return [p.firstVisibleDate for p in props[:limit]]
+
+
+@pytest.mark.parametrize("max_price", [700, 1000, 2000, 3000])
+def test_find_newest_first(repo, priced, max_price):
+    """Test that found properties are within the price and newest first."""
+    found = list(repo.find(max_price=max_price, limit=20))
+
+    assert all(p.price.amount <= max_price for p in found)
+    assert [p.firstVisibleDate for p in found] == newest(priced, max_price, 20)
+
+
+def test_find_after_changes(repo, priced):
+    """Test that the price and date indexes follow updates and deletes."""
+    latest = max(p.firstVisibleDate for p in priced)
+    cheap = priced[0].replace(
+        price=attr.evolve(priced[0].price, amount=100),
+        firstVisibleDate=latest + datetime.timedelta(days=1),
+    )
+    repo.update(cheap)
+    repo.delete(priced[1].id)
+    priced = [cheap] + priced[2:]
+
+    assert [p.id for p in repo.find(max_price=100)] == [cheap.id]
+    found = list(repo.find(max_price=2000, limit=20))
+    assert found[0] == cheap
+    assert [p.firstVisibleDate for p in found] == newest(priced, 2000, 20)
+
+
+def test_plan_summary():
+    """Test summarizing the output of explain."""
+    explained = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "LIMIT",
+                "inputStage": {
+                    "stage": "FETCH",
+                    "inputStage": {"stage": "IXSCAN", "indexName": "newest_by_price"},
+                },
+            }
+        },
+        "executionStats": {
+            "nReturned": 5,
+            "totalKeysExamined": 7,
+            "totalDocsExamined": 7,
+            "executionTimeMillis": 1,
+        },
+    }
+
+    summary = properties._plan_summary(explained)
+
+    assert summary["stages"] == ["LIMIT", "FETCH", "IXSCAN"]
+    assert summary["indexes"] == ["newest_by_price"]
+    assert not summary["inMemorySort"]
+    assert summary["docsExamined"] == 7
+
+
+def test_find_summary(repo, priced):
+    """Test that the summary projection only contains the map fields."""
+    full = list(repo.find(max_price=2000, limit=20))
+    found = list(repo.find(max_price=2000, limit=20, projection="summary"))
+
+    assert [p.id for p in found] == [p.id for p in full]
+    assert found[0] == PropertySummary(
+        id=full[0].id,
+        firstVisibleDate=full[0].firstVisibleDate,
+        location=full[0].location,
+        price=full[0].price,
+        bedrooms=full[0].bedrooms,
+        propertyImages=full[0].propertyImages[:1],
+        favorite=full[0].favorite,
+        toWorkDuration=full[0].toWorkDuration,
+    )
+
+
+def test_find_unknown_projection(repo):
+    """Test that unknown projections are rejected."""
+    with pytest.raises(exceptions.InvalidQuery):
+        repo.find(projection="everything")
+
+
+@pytest.mark.parametrize("max_price", [1000, 3000])
+def test_find_pages(repo, priced, max_price):
+    """Test that paging with after returns every property once in order."""
+    # some properties share their date
+    for p in priced[:10]:
+        repo.update(p.replace(firstVisibleDate=priced[10].firstVisibleDate))
+    expected = list(repo.find(max_price=max_price, limit=1000))
+
+    found = []
+    page = list(repo.find(max_price=max_price, limit=7))
+    while page:
+        found.extend(page)
+        last = page[-1]
+        after = (last.firstVisibleDate, last.id)
+        page = list(repo.find(max_price=max_price, limit=7, after=after))
+
+    assert [p.id for p in found] == [p.id for p in expected]
+
+
+def test_set_fields(repo, priced):
+    """Test changing single fields of a property."""
+    repo.set_fields("P-3", favorite=True, price=attr.evolve(priced[3].price, amount=1))
+
+    prop = repo.get("P-3")
+    assert prop == priced[3].replace(
+        favorite=True, price=attr.evolve(priced[3].price, amount=1)
+    )
+    assert [p.id for p in repo.find(max_price=1)] == ["P-3"]
+
+
+def test_set_fields_invalid(repo, priced):
+    """Test that unknown properties and fields are rejected."""
+    with pytest.raises(exceptions.EntityNotFound):
+        repo.set_fields("P-X", favorite=True)
+    with pytest.raises(exceptions.InvalidQuery):
+        repo.set_fields("P-3", id="P-4")
+    with pytest.raises(exceptions.InvalidQuery):
+        repo.set_fields("P-3", color="blue")
+
+
+def test_bulk_upsert(repo, priced):
+    """Test that new properties are inserted and existing ones replaced."""
+    changed = priced[0].replace(price=attr.evolve(priced[0].price, amount=1))
+    new = make_prop(1000, 51.05, 0.05)
+
+    repo.bulk_upsert([changed, new])
+
+    assert repo.count() == len(priced) + 1
+    assert repo.get(changed.id) == changed
+    assert repo.get(new.id) == new
+    assert [p.id for p in repo.find(max_price=1)] == [changed.id]
+
+
+def test_bulk_upsert_keeps_user_fields(repo, priced):
+    """Test that favorites and bans are kept when a property is scraped again."""
+    repo.set_fields(priced[0].id, favorite=True)
+    repo.set_fields(priced[1].id, banned=True)
+    scraped = [p.replace(summary="scraped again") for p in priced[:2]]
+
+    repo.bulk_upsert(scraped)
+
+    assert repo.get(priced[0].id).favorite
+    assert repo.get(priced[1].id).banned
+    assert repo.get(priced[0].id).summary == "scraped again"
+    assert [p.id for p in repo.find(favorite=True)] == [priced[0].id]
+
+
+def test_get_many(repo, priced):
+    """Test getting several properties at once."""
+    repo.set_fields("P-2", banned=True)
+    ids = ["P-1", "P-2", "P-X"]
+
+    assert repo.get_many(ids) == {"P-1": repo.get("P-1"), "P-2": repo.get("P-2")}
+    assert repo.get_many(ids, fields=["banned", "favorite"]) == {
+        "P-1": {"banned": False, "favorite": False},
+        "P-2": {"banned": True, "favorite": False},
+    }
+    with pytest.raises(exceptions.InvalidQuery):
+        repo.get_many(ids, fields=["color"])
+
+
+@pytest.fixture
+def timed(repo, priced):
+    # durations grow to the east, some are unknown
+    durations = {
+        p.id: None if i % 10 == 0 else int(p.location.longitude * 10000)
+        for i, p in enumerate(priced)
+    }
+    repo.set_durations(durations)
+    return [p.replace(toWorkDuration=durations[p.id]) for p in priced]
+
+
+@pytest.mark.parametrize("max_duration", [100, 1000, 3000])
+def test_find_max_duration(repo, timed, max_duration):
+    """Test that found properties are reachable and newest first."""
+    reachable = [
+        p
+        for p in timed
+        if p.toWorkDuration is not None and p.toWorkDuration <= max_duration
+    ]
+
+    found = list(repo.find(max_price=3000, limit=20, max_duration=max_duration))
+
+    assert [p.firstVisibleDate for p in found] == newest(reachable, 3000, 20)
+
+
+def test_find_by_duration(repo, timed):
+    """Test sorting by duration and paging through the sorted properties."""
+    expected = sorted(
+        (p for p in timed if p.toWorkDuration is not None and p.price.amount <= 2000),
+        key=lambda p: (p.toWorkDuration, p.id),
+    )
+
+    found = []
+    after = None
+    while True:
+        page = list(repo.find(max_price=2000, limit=7, sort="duration", after=after))
+        if not page:
+            break
+        found.extend(page)
+        after = (page[-1].toWorkDuration, page[-1].id)
+
+    assert [p.id for p in found] == [p.id for p in expected]
+    shortest = repo.find(max_price=2000, sort="duration", max_duration=500)
+    assert [p.id for p in shortest] == [
+        p.id for p in expected if p.toWorkDuration <= 500
+    ]
+
+
+def test_find_unknown_sort(repo):
+    """Test that unknown sorts are rejected."""
+    with pytest.raises(exceptions.InvalidQuery):
+        repo.find(sort="cheapest")
+
+
+def test_set_durations(repo, timed):
+    """Test that the duration index follows changed durations."""
+    repo.set_durations({timed[1].id: 1, timed[2].id: None, "P-X": 1})
+
+    assert repo.get(timed[1].id).toWorkDuration == 1
+    assert repo.get(timed[2].id).toWorkDuration is None
+    assert not repo.exists("P-X")
+    found = list(repo.find(max_price=3000, sort="duration", limit=1))
+    assert found == [repo.get(timed[1].id)]
+
+
+def test_find_large_area(repo, props):
+    """Test that areas much larger than the properties are searched quickly."""
+    area = geometry.box(-180, -80, 180, 80)
+
+    start = time.perf_counter()
+    found = {p.id for p in repo.find(area=area, max_price=10000, limit=1000)}
+
+    assert time.perf_counter() - start < 1
+    assert found == {p.id for p in props}
+
+
+@pytest.mark.parametrize(
+    "query, index",
+    [
+        ({"max_price": 3000}, "newest"),
+        ({"max_price": 900}, "price"),
+        ({"max_price": 3000, "area": geometry.box(0, 51, 0.1, 51.1)}, "location"),
+        ({"max_price": 3000, "sort": "duration"}, "duration"),
+    ],
+)
+def test_explain(repo, priced, query, index):
+    """Test that explain reports the index find reads."""
+    summary = repo.explain(limit=1000, **query)
+
+    assert summary["indexes"][0] == index
+    assert summary["inMemorySort"] == (index not in ("newest", "duration"))
+    assert summary["returned"] == len(list(repo.find(limit=1000, **query)))
@@ -0,0 +1,57 @@
+"""Tests for the route caches.
+"""
+import pytest  # type: ignore
+
+from crib import injection
+from crib.repositories import routes
+
+
+@pytest.fixture(params=["MemoryRouteCache", "SqliteRouteCache"])
+def cache(request, tmp_path):
+    cfg = {
+        "type": request.param,
+        "path": str(tmp_path / "cache" / "routes.sqlite"),
+        "max-entries": 2,
+    }
+    if request.param == "MemoryRouteCache":
+        del cfg["path"]
+
+    class Container:
+        config = injection.ObjectProvider({"route_cache": cfg})
+        route_cache = injection.SingletonProvider(getattr(routes, request.param))
+
+    return Container().route_cache
+
+
+def test_get_put(cache):
+    """Test storing and retrieving a route."""
+    assert cache.get("a") is None
+    cache.put("a", {"duration": {"value": 1}})
+    assert cache.get("a") == {"duration": {"value": 1}}
+
+
+def test_replace(cache):
+    """Test that putting an existing key replaces the route."""
+    cache.put("a", {"v": 1})
+    cache.put("a", {"v": 2})
+    cache.put("b", {"v": 3})
+    assert cache.get("a") == {"v": 2}
+    assert cache.get("b") == {"v": 3}
+
+
+def test_ttl(cache):
+    """Test that expired routes are not returned."""
+    cache.config["ttl"] = 0
+    cache.put("a", {"v": 1})
+    assert cache.get("a") is None
+
+
+def test_evict_least_recently_used(cache):
+    """Test that the least recently used route is evicted."""
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    cache.get("a")
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
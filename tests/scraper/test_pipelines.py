@@ -0,0 +1,52 @@
+"""Tests for the scrapy pipelines.
+"""
+from crib.scraper import items, pipelines
+
+from ..conftest import make_isolated_app
+from ..repositories.test_properties import make_prop
+
+
+def test_pipeline_batches():
+    """Test that items are stored in batches and on close."""
+    testapp = make_isolated_app(
+        {"property_repository": {"type": "MemoryPropertyRepo"}}
+    )()
+    repo = testapp.property_repository
+    pipeline = pipelines.CribPipeline("pipeline", testapp, batch_size=3, interval=0)
+    pipeline.open_spider(None)
+
+    for i in range(4):
+        prop = make_prop(i, 51.0, 0.0)
+        pipeline.process_item(items.PropertyItem(prop=prop, existing=None), None)
+    assert repo.count() == 3
+
+    # the same property twice within a batch
+    prop = make_prop(0, 51.0, 0.0, bedrooms=5)
+    pipeline.process_item(items.PropertyItem(prop=prop, existing=None), None)
+    pipeline.close_spider(None)
+
+    assert repo.count() == 4
+    assert repo.get(prop.id).bedrooms == 5
+
+
+def test_pipeline_keeps_failed_batch(monkeypatch):
+    """Test that a batch is kept until it is stored."""
+    testapp = make_isolated_app(
+        {"property_repository": {"type": "MemoryPropertyRepo"}}
+    )()
+    repo = testapp.property_repository
+    pipeline = pipelines.CribPipeline("pipeline", testapp, batch_size=10, interval=0)
+    for i in range(3):
+        prop = make_prop(i, 51.0, 0.0)
+        pipeline.process_item(items.PropertyItem(prop=prop, existing=None), None)
+
+    def fail(props):
+        raise OSError("database down")
+
+    with monkeypatch.context() as m:
+        m.setattr(repo, "bulk_upsert", fail)
+        pipeline._flush_periodically()
+    assert repo.count() == 0
+
+    pipeline.close_spider(None)
+    assert repo.count() == 3
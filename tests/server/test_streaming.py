@@ -0,0 +1,32 @@
+"""Tests for streaming responses.
+"""
+import asyncio
+import json
+
+from crib.server import streaming
+
+
+def collect(chunks):
+    async def run():
+        return b"".join([chunk async for chunk in chunks])
+
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+def test_json_array(monkeypatch):
+    """Test that the chunks form one JSON array."""
+    monkeypatch.setattr(streaming, "CHUNK_SIZE", 3)
+    items = [{"i": i} for i in range(10)]
+
+    assert json.loads(collect(streaming._json_array(iter(items)))) == items
+    assert json.loads(collect(streaming._json_array([]))) == []
+
+
+def test_ndjson(monkeypatch):
+    """Test that every item is on its own line."""
+    monkeypatch.setattr(streaming, "CHUNK_SIZE", 3)
+    items = [{"i": i} for i in range(10)]
+
+    lines = collect(streaming._ndjson(iter(items))).decode().splitlines()
+
+    assert [json.loads(line) for line in lines] == items
@@ -0,0 +1,323 @@
+"""Tests for the directions service.
+"""
+import asyncio
+
+import pytest  # type: ignore
+from shapely import geometry  # type: ignore
+
+from crib import exceptions, injection
+from crib.services import directions, ratelimit
+
+from ..conftest import make_isolated_app
+from ..domain.resources.direction_minimal import data as direction_data
+
+
+class FakeDirections(directions.GoogleDirections):
+    """Directions service which answers locally and fails on demand."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+        self.failures = {}
+        self.duration = lambda origin: 2473
+
+    async def to_work(self, origin, mode):
+        self.calls.append((origin, mode))
+        key = (origin.latitude, origin.longitude)
+        if self.failures.get(key):
+            self.failures[key] -= 1
+            raise exceptions.TransientDirectionsError("try again")
+        await asyncio.sleep(0)
+        route = dict(direction_data)
+        route["start_location"] = {"lat": origin.latitude, "lng": origin.longitude}
+        route["duration"] = {"value": self.duration(origin), "text": ""}
+        return route
+
+
+def search_area(samples):
+    return {
+        "northEast": {"lat": 51.1, "lng": 0.1},
+        "southWest": {"lat": 51.0, "lng": 0.0},
+        "latsamples": samples,
+        "lngsamples": samples,
+        "sampling": {"mode": "uniform", "threshold": 300, "depth": 3},
+    }
+
+
+@pytest.fixture
+def service():
+    cfg = {
+        "directions_repository": {"type": "MemoryDirectionsRepo"},
+        "directions_service": {
+            "search-area": search_area(3),
+            "fetch": {"max-concurrency": 4, "requests-per-second": 1000, "backoff": 0},
+        },
+    }
+
+    class Container(make_isolated_app(cfg)):
+        directions_service = injection.SingletonProvider(FakeDirections)
+
+    return Container().directions_service
+
+
+def test_fetch_map_to_work(service):
+    """Test that every raster point is fetched and stored once."""
+    points = list(service.raster_map())
+    progress = []
+
+    fetch = service.fetch_map_to_work("transit", lambda *p: progress.append(p))
+    asyncio.get_event_loop().run_until_complete(fetch)
+
+    assert len(service.calls) == len(points)
+    assert len(list(service.directions_repository.get_all())) == len(points)
+    assert progress[-1] == (len(points), len(points))
+
+
+def test_fetch_map_to_work_retries(service):
+    """Test that transient errors are retried."""
+    service.failures[(51.0, 0.0)] = 2
+
+    fetch = service.fetch_map_to_work("transit")
+    asyncio.get_event_loop().run_until_complete(fetch)
+
+    points = list(service.raster_map())
+    assert len(service.calls) == len(points) + 2
+    assert len(list(service.directions_repository.get_all())) == len(points)
+
+
+def test_fetch_map_to_work_gives_up(service):
+    """Test that points are skipped once the retries are exhausted."""
+    service.failures[(51.0, 0.0)] = 10
+
+    fetch = service.fetch_map_to_work("transit")
+    asyncio.get_event_loop().run_until_complete(fetch)
+
+    points = list(service.raster_map())
+    assert len(list(service.directions_repository.get_all())) == len(points) - 1
+
+
+def test_fetch_map_to_work_skips_fetched(service):
+    """Test that a second run only fetches missing points."""
+    loop = asyncio.get_event_loop()
+    service.failures[(51.0, 0.0)] = 10
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+    service.calls.clear()
+    service.failures.clear()
+
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+
+    assert [(o.latitude, o.longitude) for o, _ in service.calls] == [(51.0, 0.0)]
+    points = list(service.raster_map())
+    assert len(list(service.directions_repository.get_all())) == len(points)
+
+
+def test_fetch_map_to_work_refetches_stale(service):
+    """Test that points older than max-age are fetched again."""
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+    service.calls.clear()
+
+    service.config["fetch"]["max-age"] = 0
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+
+    points = list(service.raster_map())
+    assert len(service.calls) == len(points)
+    assert len(list(service.directions_repository.get_all())) == len(points)
+
+
+def test_fetch_map_to_work_per_mode(service):
+    """Test that fetched points are tracked per travel mode."""
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+    loop.run_until_complete(service.fetch_map_to_work("walking"))
+
+    points = list(service.raster_map())
+    assert len(service.calls) == 2 * len(points)
+
+
+def test_fetch_map_to_work_adaptive(service):
+    """Test that adaptive sampling only refines where durations change."""
+    service.config["search-area"] = search_area(16)
+    service.config["search-area"]["sampling"] = {
+        "mode": "adaptive",
+        "threshold": 300,
+        "depth": 2,
+    }
+    service.duration = lambda o: 1000 if o.longitude < 0.05 else 3000
+
+    asyncio.get_event_loop().run_until_complete(service.fetch_map_to_work("transit"))
+
+    points = list(service.raster_map())
+    fetched = {(o.latitude, o.longitude) for o, _ in service.calls}
+    assert len(service.calls) == len(fetched)
+    assert len(fetched) < len(points) / 2
+    # the change of duration is sampled at full resolution
+    for p in points:
+        if p["longitude"] in (service._lattice()[1][7], service._lattice()[1][8]):
+            assert (round(p["latitude"], 6), round(p["longitude"], 6)) in fetched
+
+
+def test_cached_to_work(service):
+    """Test that routes are served from the route cache."""
+    loop = asyncio.get_event_loop()
+    origin = directions.Location(latitude=51.00001, longitude=0.00001)
+    close_by = directions.Location(latitude=51.00002, longitude=0.00002)
+
+    route = loop.run_until_complete(service.cached_to_work(origin, "transit"))
+    cached = loop.run_until_complete(service.cached_to_work(close_by, "transit"))
+    assert cached == route
+    assert len(service.calls) == 1
+
+    loop.run_until_complete(service.cached_to_work(origin, "walking"))
+    loop.run_until_complete(service.cached_to_work(origin, "transit", refresh=True))
+    assert len(service.calls) == 3
+
+
+def test_cached_to_work_rate_limit(service):
+    """Test that only routes missing in the cache wait for the rate limit."""
+    loop = asyncio.get_event_loop()
+    limiter = ratelimit.TokenBucket(rate=1, capacity=1)
+    origin = directions.Location(latitude=51.00001, longitude=0.00001)
+
+    start = loop.time()
+    for _ in range(3):
+        route = service.cached_to_work(origin, "transit", limiter=limiter)
+        loop.run_until_complete(route)
+
+    assert len(service.calls) == 1
+    assert loop.time() - start < 0.5
+
+
+def test_token_bucket_rate():
+    """Test that the token bucket delays calls exceeding the rate."""
+    bucket = ratelimit.TokenBucket(rate=100, capacity=1)
+    loop = asyncio.get_event_loop()
+
+    start = loop.time()
+    for _ in range(6):
+        loop.run_until_complete(bucket.acquire())
+    assert loop.time() - start >= 0.04
+
+
+def test_get_area_adaptive(service):
+    """Test that coarse cells of adaptive sampling are part of the area."""
+    service.config["search-area"] = search_area(16)
+    service.config["search-area"]["sampling"] = {
+        "mode": "adaptive",
+        "threshold": 300,
+        "depth": 2,
+    }
+    service.duration = lambda o: 1000 if o.longitude < 0.05 else 3000
+    asyncio.get_event_loop().run_until_complete(service.fetch_map_to_work("transit"))
+
+    area = service.get_area(max_duration=2000, alpha=100, hullbuffer=0)
+
+    assert area.contains(geometry.Point(0.02, 51.05))
+    assert not area.contains(geometry.Point(0.08, 51.05))
+
+
+def test_get_areas(service):
+    """Test that all areas are computed and stored."""
+    service.duration = lambda o: int((o.longitude - 0.0) * 10000)
+    asyncio.get_event_loop().run_until_complete(service.fetch_map_to_work("transit"))
+
+    areas = service.get_areas([400, 800], alpha=10, hullbuffer=0)
+
+    assert areas[400].area < areas[800].area
+    repo = service.directions_repository
+    assert repo.get_to_work_area(400, 10, 0) is areas[400]
+    assert repo.get_to_work_area(800, 10, 0) is areas[800]
+
+
+def test_get_area_cache_key(service):
+    """Test that areas are cached per alpha and hullbuffer."""
+    service.duration = lambda o: int((o.longitude - 0.0) * 10000)
+    asyncio.get_event_loop().run_until_complete(service.fetch_map_to_work("transit"))
+
+    area = service.get_area(800, alpha=10, hullbuffer=0)
+    buffered = service.get_area(800, alpha=10, hullbuffer=0.01)
+
+    assert buffered.area > area.area
+    assert service.get_area(800, alpha=10, hullbuffer=0) is area
+
+
+def test_get_area_invalidated(service):
+    """Test that new directions invalidate the cached areas."""
+    service.duration = lambda o: int((o.longitude - 0.0) * 10000)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+    area = service.get_area(800, alpha=10, hullbuffer=0)
+
+    service.config["search-area"] = search_area(6)
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+
+    assert service.get_area(800, alpha=10, hullbuffer=0) is not area
+
+
+def test_to_work_durations(service):
+    """Test that durations below the maximum are colored."""
+    service.duration = lambda o: int((o.longitude - 0.0) * 10000) + 100
+    asyncio.get_event_loop().run_until_complete(service.fetch_map_to_work("transit"))
+
+    durations = list(service.to_work_durations("thermal_r", maxDuration=700))
+
+    assert sorted({d["durationValue"] for d in durations}) == [100, 433]
+    assert all(d["color"].startswith("#") for d in durations)
+    assert list(service.to_work_durations("thermal_r", maxDuration=50)) == []
+
+
+def test_to_work_durations_invalid_colormap(service):
+    """Test that unknown color maps are rejected before reading durations."""
+    with pytest.raises(ValueError):
+        service.to_work_durations("nonsense", maxDuration=700)
+
+
+def test_estimate_durations(service):
+    """Test that durations are interpolated between the raster points."""
+    service.duration = lambda o: int((o.longitude - 0.0) * 10000)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+    inside = directions.Location(latitude=51.05, longitude=0.05)
+    outside = directions.Location(latitude=52.0, longitude=0.05)
+
+    assert service.estimate_durations([inside, outside]) == [500, None]
+
+    service.duration = lambda o: int((o.longitude - 0.0) * 20000)
+    service.config["fetch"]["max-age"] = 0
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+    assert service.estimate_durations([inside]) == [1000]
+
+
+def test_estimate_durations_without_directions(service):
+    """Test that nothing is estimated before directions are fetched."""
+    origin = directions.Location(latitude=51.05, longitude=0.05)
+    assert service.estimate_durations([origin]) == [None]
+
+
+def test_to_work_durations_colors(service):
+    """Test that the range of the durations spans the color map."""
+    service.duration = lambda o: int((o.longitude - 0.0) * 10000) + 100
+    asyncio.get_event_loop().run_until_complete(service.fetch_map_to_work("transit"))
+
+    durations = list(service.to_work_durations("thermal_r", maxDuration=1000))
+    colors = {d["durationValue"]: d["color"] for d in durations}
+
+    lut = directions.colormap_lut("thermal_r")
+    assert directions.colormap_lut("thermal_r") is lut
+    assert colors[100] == lut[0]
+    assert colors[766] == lut[-1]
+    assert colors[433] in lut[1:-1]
+
+
+def test_get_areas_async(service):
+    """Test that the areas are awaited and stored like the blocking ones."""
+    service.duration = lambda o: int((o.longitude - 0.0) * 10000)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(service.fetch_map_to_work("transit"))
+
+    areas = loop.run_until_complete(
+        service.get_areas_async([400, 800], alpha=10, hullbuffer=0)
+    )
+
+    assert areas[400].area < areas[800].area
+    assert service.get_areas([400, 800], alpha=10, hullbuffer=0) == areas
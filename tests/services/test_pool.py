@@ -0,0 +1,57 @@
+"""Tests for the process pool.
+"""
+import asyncio
+import os
+import time
+
+import pytest  # type: ignore
+
+from ..conftest import make_isolated_app
+
+
+def slow_pid(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def fail():
+    raise ValueError("failed")
+
+
+def pool(workers):
+    return make_isolated_app({"process_pool": {"max-workers": workers}})().process_pool
+
+
+def test_coalesce():
+    """Test that running calls with the same key share their result."""
+    processes = pool(2)
+
+    first = processes.submit("key", slow_pid, 0.2)
+    same = processes.submit("key", slow_pid, 0.2)
+    other = processes.submit(None, slow_pid, 0)
+
+    assert same is first
+    assert other is not first
+    assert first.result() != os.getpid()
+    # finished calls are not shared
+    assert processes.submit("key", slow_pid, 0) is not first
+
+
+def test_run():
+    """Test awaiting results of the pool."""
+    processes = pool(1)
+
+    result = asyncio.get_event_loop().run_until_complete(
+        processes.run(None, slow_pid, 0)
+    )
+
+    assert result != os.getpid()
+
+
+def test_inline():
+    """Test that functions are called in the caller without workers."""
+    processes = pool(0)
+
+    assert processes.call("key", slow_pid, 0) == os.getpid()
+    with pytest.raises(ValueError):
+        processes.call("key", fail)
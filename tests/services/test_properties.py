@@ -0,0 +1,184 @@
+"""Tests for the property service.
+"""
+import asyncio
+
+import pytest  # type: ignore
+
+from crib import exceptions, injection
+from crib.domain import Direction
+from crib.services import properties
+
+from ..conftest import make_isolated_app
+from ..repositories.test_properties import make_prop
+from .test_directions import FakeDirections
+
+
+@pytest.fixture
+def service():
+    cfg = {
+        "property_repository": {"type": "MemoryPropertyRepo"},
+        "directions_repository": {"type": "MemoryDirectionsRepo"},
+    }
+
+    class Container(make_isolated_app(cfg)):
+        directions_service = injection.SingletonProvider(FakeDirections)
+
+    testapp = Container()
+    for i in range(25):
+        testapp.property_repository.insert(make_prop(i, 51.0 + i / 100, 0.0))
+    return testapp.property_service
+
+
+def test_find_page(service):
+    """Test paging through all properties with cursors."""
+    loop = asyncio.get_event_loop()
+    found = []
+    props, cursor = loop.run_until_complete(service.find_page(limit=10, cursor=None))
+    while cursor:
+        found.extend(props)
+        page = service.find_page(limit=10, cursor=cursor)
+        props, cursor = loop.run_until_complete(page)
+    found.extend(props)
+
+    assert sorted(p.id for p in found) == sorted(f"P-{i}" for i in range(25))
+    assert len(found) == 25
+
+
+def test_find_page_invalid_cursor(service):
+    """Test that invalid cursors are rejected."""
+    with pytest.raises(ValueError):
+        asyncio.get_event_loop().run_until_complete(service.find_page(cursor="x"))
+
+
+def test_to_work(service):
+    """Test that routes are stored per property and mode."""
+    loop = asyncio.get_event_loop()
+    fetched = service.directions_service.calls
+    prop = service.property_repository.get("P-1").replace(toWork=None)
+    service.property_repository.update(prop)
+
+    route = loop.run_until_complete(service.to_work("P-1", "walking"))
+    again = loop.run_until_complete(service.to_work("P-1", "walking"))
+
+    assert isinstance(route, Direction)
+    assert again == route
+    assert len(fetched) == 1
+    assert service.directions_repository.get_property_route("P-1", "walking") == route
+    assert service.property_repository.get("P-1") == prop
+
+    loop.run_until_complete(service.to_work("P-1", "transit"))
+    loop.run_until_complete(service.to_work("P-1", "walking", refresh=True))
+    assert len(fetched) == 3
+
+
+def test_to_work_stored_on_property(service):
+    """Test that transit routes stored on the property are still used."""
+    loop = asyncio.get_event_loop()
+    prop = service.property_repository.get("P-1")
+
+    route = loop.run_until_complete(service.to_work("P-1", "transit"))
+
+    assert route == prop.toWork
+    assert not service.directions_service.calls
+
+
+def test_to_work_not_found(service):
+    """Test that routes of unknown properties are not fetched."""
+    with pytest.raises(exceptions.EntityNotFound):
+        asyncio.get_event_loop().run_until_complete(service.to_work("P-X", "transit"))
+
+
+def test_to_work_no_route(service, monkeypatch):
+    """Test that missing routes are neither stored nor cached."""
+    loop = asyncio.get_event_loop()
+    calls = []
+
+    async def zero_results(origin, mode):
+        calls.append(origin)
+        return {}
+
+    monkeypatch.setattr(service.directions_service, "to_work", zero_results)
+
+    assert loop.run_until_complete(service.to_work("P-1", "walking")) is None
+    assert loop.run_until_complete(service.to_work("P-1", "walking")) is None
+    assert len(calls) == 2
+    assert service.directions_repository.get_property_route("P-1", "walking") is None
+
+
+def test_favorite_and_ban(service):
+    """Test toggling favorite and banned."""
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(service.favorite("P-2", True))
+    loop.run_until_complete(service.ban("P-3", True))
+
+    assert service.property_repository.get("P-2").favorite
+    assert service.property_repository.get("P-3").banned
+    with pytest.raises(exceptions.EntityNotFound):
+        loop.run_until_complete(service.favorite("P-X", True))
+
+
+def test_with_durations(service, monkeypatch):
+    """Test that the durations of all properties are estimated in batches."""
+    batches = []
+
+    def estimate(locations):
+        batch = [loc.latitude for loc in locations]
+        batches.append(batch)
+        return [int(lat * 100) for lat in batch]
+
+    monkeypatch.setattr(properties, "ESTIMATE_BATCH", 10)
+    monkeypatch.setattr(service.directions_service, "estimate_durations", estimate)
+    pairs = list(service.with_durations(service.iter_find()))
+
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert all(d == int(p.location.latitude * 100) for p, d in pairs)
+
+
+def test_update_durations(service, monkeypatch):
+    """Test storing the durations and paging through properties by duration."""
+    loop = asyncio.get_event_loop()
+
+    def estimate(locations):
+        return [round((loc.latitude - 51.0) * 10000) for loc in locations]
+
+    monkeypatch.setattr(properties, "ESTIMATE_BATCH", 10)
+    monkeypatch.setattr(service.directions_service, "estimate_durations", estimate)
+    assert service.update_durations() == 25
+
+    found = []
+    cursor = None
+    while True:
+        page = service.find_page(
+            limit=4, max_duration=1000, sort="duration", cursor=cursor
+        )
+        props, cursor = loop.run_until_complete(page)
+        found.extend(props)
+        if not cursor:
+            break
+    assert [p.id for p in found] == [f"P-{i}" for i in range(11)]
+    assert [p.toWorkDuration for p in found] == list(range(0, 1100, 100))
+
+
+def test_complete_durations(service, monkeypatch):
+    """Test that only missing durations are estimated."""
+    estimated = []
+
+    def estimate(locations):
+        locations = list(locations)
+        estimated.extend(locations)
+        return [600] * len(locations)
+
+    monkeypatch.setattr(service.directions_service, "estimate_durations", estimate)
+    durations = {f"P-{i}": None for i in range(25)}
+    service.property_repository.set_durations(dict(durations, **{"P-1": 300}))
+
+    props = {p.id: p for p in service.complete_durations(service.iter_find())}
+
+    assert len(estimated) == 24
+    assert props["P-1"].toWorkDuration == 300
+    assert props["P-2"].toWorkDuration == 600
+    assert service.property_repository.get("P-2").toWorkDuration is None
+
+    assert service.update_durations(unestimated=True) == 24
+    assert service.property_repository.get("P-1").toWorkDuration == 300
+    assert service.property_repository.get("P-2").toWorkDuration == 600